@@ -0,0 +1,181 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from lap_times import format_lap_times
+
+DRIVER_KEY = ["NUMBER", "DRIVER_NAME"]
+# all the session comparison needs, the other columns of stored sessions are never read
+COMPARISON_COLUMNS = DRIVER_KEY + ["S1_MS", "S2_MS", "S3_MS", "LAP_TIME_MS"]
+
+
+def fastest_lap(df: pd.DataFrame) -> pd.DataFrame:
+    """Fastest lap per driver with its sector times, position ``P`` and ``GAP_MS`` to the leader."""
+    df = df[df["LAP_TIME_MS"].notna()]
+    fastest_lap_index = df.groupby(DRIVER_KEY, observed=True)["LAP_TIME_MS"].idxmin()
+    return rank_fastest_laps(df.loc[fastest_lap_index, DRIVER_KEY + ["S1_MS", "S2_MS", "S3_MS", "LAP_TIME_MS"]])
+
+
+def rank_fastest_laps(df_fastest_lap_per_driver: pd.DataFrame) -> pd.DataFrame:
+    df_fastest_lap_per_driver = df_fastest_lap_per_driver.sort_values(by="LAP_TIME_MS", kind="mergesort")
+    df_fastest_lap_per_driver["P"] = range(1, len(df_fastest_lap_per_driver) + 1)
+    df_fastest_lap_per_driver["GAP_MS"] = df_fastest_lap_per_driver["LAP_TIME_MS"] - \
+                                          df_fastest_lap_per_driver["LAP_TIME_MS"].min()
+    return df_fastest_lap_per_driver.reset_index(drop=True)
+
+
+def ideal_lap(df: pd.DataFrame, df_fastest_lap_per_driver: pd.DataFrame) -> pd.DataFrame:
+    """Ideal lap (sum of best sectors) per driver with ``P``, ``GAP_MS`` and ``IDEAL_VS_FASTEST_MS``."""
+    # over all laps: a valid sector time counts even if its lap has no (parsable) lap time
+    df_best_sectors = df.groupby(DRIVER_KEY, observed=True).agg(
+        {"S1_MS": "min", "S2_MS": "min", "S3_MS": "min"}).reset_index()
+    return rank_ideal_laps(df_best_sectors, df_fastest_lap_per_driver)
+
+
+def rank_ideal_laps(df_best_sectors: pd.DataFrame, df_fastest_lap_per_driver: pd.DataFrame) -> pd.DataFrame:
+    df_ideal_lap_per_driver = df_best_sectors.copy()
+    df_ideal_lap_per_driver["IDEAL_LAP_MS"] = df_ideal_lap_per_driver["S1_MS"] + \
+                                              df_ideal_lap_per_driver["S2_MS"] + \
+                                              df_ideal_lap_per_driver["S3_MS"]
+    df_ideal_lap_per_driver = df_ideal_lap_per_driver.sort_values(by="IDEAL_LAP_MS", kind="mergesort")
+    df_ideal_lap_per_driver["P"] = range(1, len(df_ideal_lap_per_driver) + 1)
+    df_ideal_lap_per_driver["GAP_MS"] = df_ideal_lap_per_driver["IDEAL_LAP_MS"] - \
+                                        df_ideal_lap_per_driver["IDEAL_LAP_MS"].min()
+
+    df_ideal_lap_per_driver = pd.merge(df_ideal_lap_per_driver,
+                                       df_fastest_lap_per_driver[DRIVER_KEY + ["LAP_TIME_MS"]],
+                                       how="left", on=DRIVER_KEY)
+    df_ideal_lap_per_driver["IDEAL_VS_FASTEST_MS"] = df_ideal_lap_per_driver["LAP_TIME_MS"] - \
+                                                     df_ideal_lap_per_driver["IDEAL_LAP_MS"]
+    return df_ideal_lap_per_driver
+
+
+def potential_positions(fastest_lap_times: np.ndarray, own_fastest_lap_times: np.ndarray,
+                        ideal_lap_times: np.ndarray, fastest_positions: np.ndarray) -> np.ndarray:
+    # Position each driver would reach if only they drove their ideal lap while everybody else keeps
+    # their fastest lap. Equivalent to swapping in the ideal time and stable-sorting the fastest lap
+    # table per driver, but done with one searchsorted over the sorted fastest lap times.
+    laps_before = np.searchsorted(fastest_lap_times, ideal_lap_times, side="left")
+    laps_before_or_equal = np.searchsorted(fastest_lap_times, ideal_lap_times, side="right")
+    return np.where(own_fastest_lap_times > ideal_lap_times,
+                    # improved: every driver with an equal time was already ahead in the table
+                    laps_before_or_equal + 1,
+                    np.where(own_fastest_lap_times == ideal_lap_times,
+                             # unchanged: keep the current position among equal times
+                             fastest_positions,
+                             # slower (inconsistent sector data): the own row moves behind, ahead of equal times
+                             laps_before))
+
+
+def position_deltas(df_fastest_lap_per_driver: pd.DataFrame, df_ideal_lap_per_driver: pd.DataFrame) -> pd.DataFrame:
+    """Per driver: fastest lap position, position if all drive their ideal lap, and if only they do."""
+    # position change: all improve from fastest to ideal
+    position_fastest_lap = df_fastest_lap_per_driver[["DRIVER_NAME", "P"]]
+    position_fastest_lap.columns = ["DRIVER_NAME", "P_fastest"]
+    position_ideal_lap = df_ideal_lap_per_driver[["DRIVER_NAME", "P", "IDEAL_LAP_MS", "LAP_TIME_MS"]]
+    position_ideal_lap.columns = ["DRIVER_NAME", "P_ideal", "IDEAL_LAP_MS", "LAP_TIME_MS"]
+    position_fastest_vs_ideal = pd.merge(position_fastest_lap, position_ideal_lap, how="inner", on="DRIVER_NAME")
+
+    # position change: only you improve from fastest to ideal
+    position_fastest_vs_ideal["your_ideal_position"] = potential_positions(
+        df_fastest_lap_per_driver["LAP_TIME_MS"].to_numpy(),
+        position_fastest_vs_ideal["LAP_TIME_MS"].to_numpy(),
+        position_fastest_vs_ideal["IDEAL_LAP_MS"].to_numpy(),
+        position_fastest_vs_ideal["P_fastest"].to_numpy())
+    return position_fastest_vs_ideal[["DRIVER_NAME", "P_fastest", "P_ideal", "your_ideal_position"]]
+
+
+def fastest_lap_table(df_fastest_lap_per_driver: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "P": df_fastest_lap_per_driver["P"],
+        "DRIVER_NAME": df_fastest_lap_per_driver["DRIVER_NAME"],
+        **{column: format_lap_times(df_fastest_lap_per_driver[f"{column}_MS"])
+           for column in ["S1", "S2", "S3", "LAP_TIME", "GAP"]}
+    })
+
+
+def ideal_lap_table(df_ideal_lap_per_driver: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame({
+        "P": df_ideal_lap_per_driver["P"],
+        "DRIVER_NAME": df_ideal_lap_per_driver["DRIVER_NAME"],
+        **{column: format_lap_times(df_ideal_lap_per_driver[f"{column}_MS"])
+           for column in ["S1", "S2", "S3", "IDEAL_LAP", "GAP", "IDEAL_VS_FASTEST"]}
+    })
+
+
+def filter_laps(df: pd.DataFrame, lap_range: list = None, teams: list = None) -> pd.DataFrame:
+    mask = np.ones(len(df), dtype=bool)
+    if lap_range is not None:
+        # rows without a lap number are never in the range
+        in_range = (df.LAP_NUMBER >= lap_range[0]) & (df.LAP_NUMBER <= lap_range[1])
+        mask &= in_range.to_numpy(dtype=bool, na_value=False)
+    if teams is not None:
+        mask &= df.TEAM.isin(teams).to_numpy()
+    return df[mask]
+
+
+def lap_sequence_matrix(df: pd.DataFrame):
+    # drivers x laps matrices of lap times (NaN for laps a driver has no time for) and the raw
+    # timing strings shown in the cells ("-" for the gaps), built with one unstack; laps without a
+    # lap number have no column
+    laps = df[df["LAP_NUMBER"].notna()].drop_duplicates(subset=["DRIVER_NAME", "LAP_NUMBER"]) \
+        .set_index(["DRIVER_NAME", "LAP_NUMBER"])
+    lap_times = laps["LAP_TIME_MS"].unstack("LAP_NUMBER").sort_index().sort_index(axis=1)
+    lap_texts = laps["LAP_TIME"].unstack("LAP_NUMBER").reindex_like(lap_times).fillna("-")
+    return lap_times, lap_texts
+
+
+def downsample_laps(lap_times: pd.DataFrame, max_laps: int):
+    """Median over runs of consecutive lap columns so at most ``max_laps`` columns remain.
+
+    Returns the downsampled matrix, labelled with the first lap of every run, and the run length.
+    """
+    laps_per_column = max(1, math.ceil(lap_times.shape[1] / max_laps))
+    if laps_per_column == 1:
+        return lap_times, 1
+    runs = np.arange(lap_times.shape[1]) // laps_per_column
+    downsampled = lap_times.T.groupby(runs).median().T
+    downsampled.columns = lap_times.columns[::laps_per_column]
+    return downsampled, laps_per_column
+
+
+def analyse_session(df: pd.DataFrame) -> dict:
+    """Run the full lap analysis of one session, all times in milliseconds."""
+    df_fastest_lap_per_driver = fastest_lap(df)
+    df_ideal_lap_per_driver = ideal_lap(df, df_fastest_lap_per_driver)
+    lap_times, _ = lap_sequence_matrix(df)
+    return {
+        "fastest_lap": df_fastest_lap_per_driver,
+        "ideal_lap": df_ideal_lap_per_driver,
+        "positions": position_deltas(df_fastest_lap_per_driver, df_ideal_lap_per_driver),
+        "lap_sequence": lap_times,
+    }
+
+
+def compare_sessions(sessions: dict) -> pd.DataFrame:
+    """Fastest and ideal lap per driver (rows) and session (``sessions`` maps labels to frames).
+
+    Columns are ``(<label>, "LAP_TIME_MS")`` and ``(<label>, "IDEAL_LAP_MS")``, drivers are ordered by
+    their best fastest lap over all sessions and NaN where a driver didn't take part.
+    """
+    bests = {}
+    for label, df in sessions.items():
+        df_fastest_lap_per_driver = fastest_lap(df)
+        df_ideal_lap_per_driver = ideal_lap(df, df_fastest_lap_per_driver)
+        # drivers are matched by name, car numbers can change between sessions
+        bests[label] = df_ideal_lap_per_driver.astype({"DRIVER_NAME": str}) \
+            .groupby("DRIVER_NAME")[["LAP_TIME_MS", "IDEAL_LAP_MS"]].min()
+    if not bests:
+        return pd.DataFrame()
+    comparison = pd.concat(bests, axis=1)
+    order = comparison.xs("LAP_TIME_MS", axis=1, level=1).min(axis=1).sort_values(kind="mergesort").index
+    return comparison.loc[order]
+
+
+def session_comparison_table(comparison: pd.DataFrame) -> pd.DataFrame:
+    table = pd.DataFrame({"DRIVER_NAME": comparison.index})
+    for label, column in comparison.columns:
+        name = "FASTEST" if column == "LAP_TIME_MS" else "IDEAL"
+        table[f"{label} {name}"] = format_lap_times(comparison[label, column]).to_numpy()
+    return table
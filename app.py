@@ -1,14 +1,71 @@
+import argparse
+import gc
+import logging
+import sys
+import time
+
 from flask import Flask, render_template
-from dash_app import create_dash_app
-app = Flask(__name__)
 
-@app.route("/")
-def index():
-    return render_template("index.html")
+logger = logging.getLogger(__name__)
+
+
+def create_app():
+    """Build the Flask app with the dashboard.
+
+    Run as ``gunicorn --preload "app:create_app()"`` so the app is built once in the master and the
+    workers share the imported modules copy-on-write. Importing this module stays cheap, pandas,
+    plotly and dash are only imported here.
+    """
+    timings = {}
+    start = time.perf_counter()
+    app = Flask(__name__)
+
+    @app.route("/")
+    def index():
+        return render_template("index.html")
+
+    from dash_app import create_dash_app, preload_modules
+    from instrumentation import register_metrics_route
+    from live import register_live_routes
+    preload_modules()
+    timings["imports"] = time.perf_counter() - start
+
+    create_dash_app(app)
+    register_live_routes(app)
+    register_metrics_route(app)
+    timings["dash_app"] = time.perf_counter() - start - timings["imports"]
+
+    # keep the garbage collector from touching (and so copying) the objects preloaded workers share
+    gc.freeze()
+    app.config["STARTUP_TIMINGS"] = timings
+    logger.info("App created in %.2f s (imports %.2f s, dash app %.2f s)",
+                sum(timings.values()), timings["imports"], timings["dash_app"])
+    return app
+
 
+def measure_startup():
+    start = time.perf_counter()
+    app = create_app()
+    timings = dict(app.config["STARTUP_TIMINGS"])
+    # the layout is serialised on the first request for it
+    layout_start = time.perf_counter()
+    app.test_client().get("/dashboard/_dash-layout")
+    timings["first_layout"] = time.perf_counter() - layout_start
+    timings["total"] = time.perf_counter() - start
 
+    from ingest import peak_rss_bytes
+    for name, seconds in timings.items():
+        print(f"{name:<15}{seconds:>8.3f} s")
+    print(f"{'modules':<15}{len(sys.modules):>8}")
+    print(f"{'peak RSS':<15}{peak_rss_bytes() / 1024 ** 2:>8.1f} MB")
 
-create_dash_app(app)
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the dashboard with the Flask development server.")
+    parser.add_argument("--measure-startup", action="store_true",
+                        help="only build the app and report the import and layout build times")
+    args = parser.parse_args()
+    if args.measure_startup:
+        measure_startup()
+    else:
+        create_app().run(debug=True)
@@ -0,0 +1,16 @@
+import os
+
+# caches and stores default to a directory only the app's user can access: files in them are
+# loaded back, so they must never live in the shared, predictable temp directory
+DATA_DIR = os.environ.get("RACING_X_DATA_DIR", os.path.join(os.path.expanduser("~"), ".cache", "racing-x-data"))
+
+
+def private_dir(path: str) -> str:
+    """Create ``path`` (readable by the owner only) if it doesn't exist yet and return it."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def data_dir(name: str) -> str:
+    private_dir(DATA_DIR)
+    return private_dir(os.path.join(DATA_DIR, name))
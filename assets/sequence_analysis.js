@@ -0,0 +1,94 @@
+// Lap slider and team filter of the sequence analysis, applied in the browser to the lap matrix
+// the server sends once per dataset (see sequence_matrix_data in dash_app.py). Mirrors lap_sequence_figure.
+(function () {
+    function median(values) {
+        if (values.length === 0) {
+            return null;
+        }
+        const sorted = values.slice().sort((a, b) => a - b);
+        const middle = Math.floor(sorted.length / 2);
+        return sorted.length % 2 ? sorted[middle] : (sorted[middle - 1] + sorted[middle]) / 2;
+    }
+
+    // tenths of a second rounded like numpy.round on the server, i.e. half to even
+    function tenths(milliseconds) {
+        const scaled = milliseconds / 1000 * 10;
+        let rounded = Math.round(scaled);
+        if (rounded - scaled === 0.5 && rounded % 2 !== 0) {
+            rounded -= 1;
+        }
+        return rounded / 10;
+    }
+
+    function heatmapFigure(matrix, lapRange, teams) {
+        const selectedTeams = new Set(teams);
+        const present = (row, column) => matrix.texts[row][column] !== null;
+
+        const columns = [];
+        matrix.laps.forEach((lap, column) => {
+            if (lap >= lapRange[0] && lap <= lapRange[1]) {
+                columns.push(column);
+            }
+        });
+        const rows = [];
+        matrix.drivers.forEach((driver, row) => {
+            if (selectedTeams.has(matrix.driver_teams[row]) && columns.some(column => present(row, column))) {
+                rows.push(row);
+            }
+        });
+        // only laps at least one of the selected drivers has a time for
+        const laps = columns.filter(column => rows.some(row => present(row, column)));
+
+        // longer races as medians over runs of consecutive laps, like analysis.downsample_laps
+        const lapsPerColumn = Math.max(1, Math.ceil(laps.length / matrix.max_laps));
+        const x = [];
+        const z = rows.map(() => []);
+        for (let start = 0; start < laps.length; start += lapsPerColumn) {
+            const run = laps.slice(start, start + lapsPerColumn);
+            x.push(matrix.laps[run[0]]);
+            rows.forEach((row, index) => {
+                const lapTime = median(run.map(column => matrix.times[row][column]).filter(time => time !== null));
+                z[index].push(lapTime === null ? null : tenths(lapTime));
+            });
+        }
+
+        const heatmap = {
+            type: 'heatmap',
+            z: z,
+            x: x,
+            y: rows.map(row => matrix.drivers[row].slice(0, 10)),
+            colorscale: matrix.colorscale,
+            showscale: false,
+            hoverongaps: false,
+            hovertemplate: '%{y} lap %{x}: %{z:.1f} s<extra></extra>'
+        };
+        if (lapsPerColumn === 1 && rows.length * laps.length <= matrix.text_max_cells) {
+            heatmap.text = rows.map(row => laps.map(column => present(row, column) ? matrix.texts[row][column] : '-'));
+            heatmap.texttemplate = '%{text}';
+            heatmap.textfont = {size: 15};
+            heatmap.hovertemplate = '%{y} lap %{x}: %{text}<extra></extra>';
+        }
+        const xTitle = lapsPerColumn === 1 ? 'LAP NUMBER' : `LAP NUMBER (median of ${lapsPerColumn} laps)`;
+        return {data: [heatmap], layout: {xaxis: {title: {text: xTitle}}, height: 700}};
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        sequence_analysis: {
+            // outputs: clientside heatmap figure, its container's style, the server container's style
+            // and the filter the server path reacts to
+            filter_heatmap: function (lapRange, teams, matrix, datasetId) {
+                const noUpdate = window.dash_clientside.no_update;
+                // the matrix of a new dataset is still being built, the store holds the previous one
+                if (!matrix || !lapRange || matrix.dataset_id !== datasetId) {
+                    return [noUpdate, noUpdate, noUpdate, noUpdate];
+                }
+                if (!matrix.times) {
+                    // too large to send to the browser, filtered on the server
+                    return [noUpdate, {display: 'none'}, {},
+                            {dataset_id: matrix.dataset_id, lap_range: lapRange, teams: teams || []}];
+                }
+                return [heatmapFigure(matrix, lapRange, teams || []), {}, {display: 'none'}, noUpdate];
+            }
+        }
+    });
+})();
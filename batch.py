@@ -0,0 +1,75 @@
+"""Precompute the lap analysis for a directory of timing CSVs.
+
+    python batch.py timing_exports/ results/ --sep ";" --workers 4 --format parquet
+
+Every ``<session>.csv`` gets a ``results/<session>/`` directory with one file per
+analysis result (fastest_lap, ideal_lap, positions, lap_sequence), all times in ms.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import analysis
+from ingest import CHUNK_ROWS, read_timing_csv
+
+
+def write_result(df: pd.DataFrame, path: str, output_format: str):
+    if output_format == "parquet":
+        df.to_parquet(f"{path}.parquet", index=False)
+    else:
+        df.to_json(f"{path}.json", orient="records")
+
+
+def process_session(path: str, output_dir: str, column_separator: str, output_format: str) -> dict:
+    session = os.path.splitext(os.path.basename(path))[0]
+    df = read_timing_csv(path, column_separator, chunksize=CHUNK_ROWS)
+    results = analysis.analyse_session(df)
+    # lap numbers become column names, which parquet and records-json both want as strings
+    results["lap_sequence"] = results["lap_sequence"].rename(columns=str).reset_index()
+
+    session_dir = os.path.join(output_dir, session)
+    os.makedirs(session_dir, exist_ok=True)
+    for name, result in results.items():
+        write_result(result, os.path.join(session_dir, name), output_format)
+    return {"session": session, "laps": len(df), "drivers": len(results["fastest_lap"])}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Precompute the lap analysis for a directory of timing CSVs.")
+    parser.add_argument("input_dir", help="directory containing the timing .csv exports")
+    parser.add_argument("output_dir", help="directory the results are written to")
+    parser.add_argument("--sep", default=";", help="column separator of the CSVs (default: ';')")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--format", choices=["parquet", "json"], default="parquet", dest="output_format")
+    args = parser.parse_args(argv)
+
+    paths = sorted(os.path.join(args.input_dir, name) for name in os.listdir(args.input_dir)
+                   if name.endswith(".csv"))
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    processed, failed = [], []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(process_session, path, args.output_dir, args.sep, args.output_format): path
+                   for path in paths}
+        for future in as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as e:
+                print(f"{futures[future]}: {type(e).__name__}: {e}", file=sys.stderr)
+                failed.append(futures[future])
+            else:
+                print(f"{summary['session']}: {summary['laps']} laps, {summary['drivers']} drivers")
+                processed.append(summary)
+
+    with open(os.path.join(args.output_dir, "index.json"), "w") as index_file:
+        json.dump({"sessions": sorted(processed, key=lambda summary: summary["session"]), "failed": failed},
+                  index_file, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
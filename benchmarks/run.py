@@ -0,0 +1,217 @@
+"""Time the dashboard callbacks on synthetic timing sheets.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --sizes sprint feature --compare results.json
+
+Every callback is called through the Dash HTTP endpoint with cold caches, so the timings include
+the JSON serialisation and the payload sizes are what the browser receives. The compute stages are
+additionally timed on their own by calling the ingest and analysis functions directly.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# keep the benchmark's caches away from the ones of a running dashboard
+BENCHMARK_DIR = tempfile.mkdtemp(prefix="racing-x-data-benchmark-")
+for variable, directory in [("RESULT_CACHE_DIR", "results"), ("LIVE_TIMING_DIR", "live"),
+                            ("SESSION_STORE_DIR", "sessions")]:
+    os.environ[variable] = os.path.join(BENCHMARK_DIR, directory)
+# run the background jobs inline, so a callback's time is the time until its result is rendered
+os.environ["JOB_WORKERS"] = "0"
+
+import pandas as pd  # noqa: E402
+
+import analysis  # noqa: E402
+from benchmarks.synthetic import RACE_SIZES, timing_csv  # noqa: E402
+from dataset_cache import dataset_cache  # noqa: E402
+from ingest import read_timing_upload  # noqa: E402
+from lap_times import TIME_COLUMNS, parse_lap_times  # noqa: E402
+from memo import result_cache  # noqa: E402
+from session_store import session_store  # noqa: E402
+
+
+def time_call(function, repeat: int, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+
+def clear_caches():
+    dataset_cache.clear()
+    result_cache.clear()
+    session_store.clear()
+
+
+class DashClient:
+    """Calls Dash callbacks the way the browser does, through /_dash-update-component."""
+
+    def __init__(self, flask_app, url_base_pathname: str = "/dashboard/"):
+        self.client = flask_app.test_client()
+        self.url = f"{url_base_pathname}_dash-update-component"
+
+    def call(self, outputs: list, inputs: dict, state: dict = None):
+        def props(values):
+            return [{"id": component_id, "property": prop, "value": value}
+                    for (component_id, prop), value in values.items()]
+
+        output_specs = [{"id": component_id, "property": prop} for component_id, prop in outputs]
+        payload = {
+            # Dash's notation for one output ("id.prop") and for multiple ("..id.prop...id.prop..")
+            "output": f"{outputs[0][0]}.{outputs[0][1]}" if len(outputs) == 1
+            else ".." + "...".join(f"{component_id}.{prop}" for component_id, prop in outputs) + "..",
+            "outputs": output_specs[0] if len(outputs) == 1 else output_specs,
+            "inputs": props(inputs),
+            "state": props(state or {}),
+            "changedPropIds": [f"{component_id}.{prop}" for component_id, prop in inputs],
+        }
+        request_body = json.dumps(payload).encode("utf-8")
+        response = self.client.post(self.url, data=request_body, content_type="application/json")
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"{outputs} failed with {response.status_code}: {response.data[:500]!r}")
+        return len(request_body), response.data
+
+
+def benchmark_callbacks(client: DashClient, csv: bytes, column_separator: str, repeat: int) -> dict:
+    contents = "data:text/csv;base64," + base64.b64encode(csv).decode("ascii")
+    dataset_id = None
+
+    def upload():
+        return client.call([("output-datatable", "children")],
+                           {("upload-data", "contents"): contents, ("column-separator-id", "value"): column_separator,
+                            ("stored-session", "value"): None},
+                           {("upload-data", "filename"): "benchmark.csv", ("session-event", "value"): None,
+                            ("session-name", "value"): None})
+
+    def callback(outputs, inputs, state=None):
+        return lambda: client.call(outputs, {("stored-data", "data"): dataset_id, **inputs}, state)
+
+    results = {}
+    (request_bytes, response), timings = time_call(upload, repeat, setup=clear_caches)
+    results["parse_contents"] = (timings, request_bytes, len(response))
+    dataset_id = json.loads(response)["response"]["output-datatable"]["children"][0]["props"]["children"][-1][
+        "props"]["data"]
+
+    df = dataset_cache.get(dataset_id)
+    lap_range = [int(df.LAP_NUMBER.min()), int(df.LAP_NUMBER.max())]
+    teams = sorted(df.TEAM.unique().astype(str))
+
+    def table_page(table_id: str, page_size: int) -> dict:
+        # inputs are matched to the callback arguments by position
+        return {(table_id, "page_current"): 0, (table_id, "page_size"): page_size,
+                (table_id, "sort_by"): [], (table_id, "filter_query"): ""}
+
+    cases = {
+        "best_lap": callback([("best-lap-table", "children"), ("best-lap-job", "data"),
+                              ("best-lap-job-interval", "disabled"), ("best-lap-progress", "children")],
+                             {("best-lap-job-interval", "n_intervals"): None}, {("best-lap-job", "data"): None}),
+        "lap_slider": callback([("lap-slider-output", "children")], {}),
+        # the browser path: the complete lap matrix, or only the dataset id if it's too large
+        "sequence_matrix": callback([("sequence-matrix", "data"), ("sequence-matrix-job", "data"),
+                                     ("sequence-matrix-job-interval", "disabled"),
+                                     ("sequence-matrix-progress", "children")],
+                                    {("sequence-matrix-job-interval", "n_intervals"): None},
+                                    {("sequence-matrix-job", "data"): None}),
+        # the server path, taken for lap matrices too large to be filtered in the browser
+        "sequence_analysis": lambda: client.call(
+            [("output-sequence-analysis", "children"), ("sequence-job", "data"),
+             ("sequence-job-interval", "disabled"), ("sequence-progress", "children")],
+            {("sequence-filter", "data"): {"dataset_id": dataset_id, "lap_range": lap_range, "teams": teams},
+             ("sequence-job-interval", "n_intervals"): None},
+            {("sequence-job", "data"): None}),
+        "preview_page": callback([("preview-table", "data"), ("preview-table", "page_count")],
+                                 table_page("preview-table", 5)),
+        "fastest_lap_page": callback([("fastest-lap-table", "data"), ("fastest-lap-table", "page_count")],
+                                     table_page("fastest-lap-table", 20)),
+    }
+    for name, case in cases.items():
+        (request_bytes, response), timings = time_call(case, repeat, setup=result_cache.clear)
+        results[name] = (timings, request_bytes, len(response))
+    return results
+
+
+def benchmark_compute(csv: bytes, column_separator: str, repeat: int) -> dict:
+    (df, _), ingest_timings = time_call(lambda: read_timing_upload(csv, "benchmark.csv", column_separator), repeat)
+    _, parse_timings = time_call(lambda: [parse_lap_times(df[column]) for column in TIME_COLUMNS], repeat)
+    _, analysis_timings = time_call(lambda: analysis.analyse_session(df), repeat)
+    _, matrix_timings = time_call(lambda: analysis.lap_sequence_matrix(df), repeat)
+    return {"ingest": (ingest_timings, None, None),
+            "parse_lap_times": (parse_timings, None, None),
+            "analyse_session": (analysis_timings, None, None),
+            "lap_sequence_matrix": (matrix_timings, None, None)}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path) as baseline_file:
+        baseline = {(entry["size"], entry["separator"], entry["stage"]): entry
+                    for entry in json.load(baseline_file)["results"]}
+    print(f"\n{'size':<15}{'sep':<5}{'stage':<22}{'time x':>9}{'payload x':>11}")
+    for entry in results:
+        before = baseline.get((entry["size"], entry["separator"], entry["stage"]))
+        if before is None:
+            continue
+        time_ratio = entry["median_seconds"] / before["median_seconds"] if before["median_seconds"] else float("nan")
+        payload_ratio = (entry["response_bytes"] / before["response_bytes"]
+                         if entry["response_bytes"] and before["response_bytes"] else float("nan"))
+        print(f"{entry['size']:<15}{entry['separator']:<5}{entry['stage']:<22}{time_ratio:>9.2f}{payload_ratio:>11.2f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard callbacks on synthetic timing sheets.")
+    parser.add_argument("--sizes", nargs="+", choices=list(RACE_SIZES), default=list(RACE_SIZES))
+    parser.add_argument("--separators", nargs="+", choices=[",", ";"], default=[",", ";"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results as JSON to this path")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    client = DashClient(create_app())
+
+    results = []
+    print(f"{'size':<15}{'sep':<5}{'stage':<22}{'median s':>10}{'min s':>10}{'response':>12}")
+    for size in args.sizes:
+        for column_separator in args.separators:
+            csv = timing_csv(size, column_separator)
+            rows = csv.count(b"\n") - 1
+            stages = {**benchmark_compute(csv, column_separator, args.repeat),
+                      **benchmark_callbacks(client, csv, column_separator, args.repeat)}
+            for stage, (timings, request_bytes, response_bytes) in stages.items():
+                entry = {"size": size, "separator": column_separator, "rows": rows, "file_bytes": len(csv),
+                         "stage": stage, "median_seconds": statistics.median(timings), "min_seconds": min(timings),
+                         "request_bytes": request_bytes, "response_bytes": response_bytes}
+                results.append(entry)
+                print(f"{size:<15}{column_separator:<5}{stage:<22}{entry['median_seconds']:>10.4f}"
+                      f"{entry['min_seconds']:>10.4f}{response_bytes or '':>12}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"revision": git_revision(), "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "python": platform.python_version(), "pandas": pd.__version__,
+                       "repeat": args.repeat, "results": results}, output_file, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Synthetic timing sheets in the column layout the dashboard expects.
+
+    python -m benchmarks.synthetic endurance_24h race.csv --sep ";"
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# name: (cars, drivers per car, laps)
+RACE_SIZES = {
+    "sprint": (20, 1, 25),
+    "feature": (30, 1, 60),
+    "endurance_6h": (60, 3, 200),
+    "endurance_24h": (60, 3, 800),
+}
+COLUMNS = ["NUMBER", "DRIVER_NAME", "TEAM", "LAP_NUMBER", "LAP_TIME", "S1", "S2", "S3",
+           "S1_LARGE", "S2_LARGE", "S3_LARGE"]
+
+
+def format_times(milliseconds: np.ndarray, with_minutes: np.ndarray) -> pd.Series:
+    # "M:SS.fff", or "SS.fff" where with_minutes is False and the time is below a minute
+    minutes, rest = np.divmod(milliseconds, 60_000)
+    seconds, millis = np.divmod(rest, 1_000)
+    seconds = pd.Series(seconds).astype(str)
+    fraction = "." + pd.Series(millis).astype(str).str.zfill(3)
+    long_format = pd.Series(minutes).astype(str) + ":" + seconds.str.zfill(2) + fraction
+    return long_format.where(with_minutes | (minutes > 0), seconds + fraction)
+
+
+def generate_timing_sheet(cars: int, drivers_per_car: int, laps: int, seed: int = 0) -> pd.DataFrame:
+    """One row per car and lap, drivers of a car take turns in stints of a tenth of the race."""
+    rng = np.random.default_rng(seed)
+    car = np.repeat(np.arange(cars), laps)
+    lap_number = np.tile(np.arange(1, laps + 1), cars)
+    stint = (lap_number - 1) // max(1, laps // 10)
+    driver = car * drivers_per_car + stint % drivers_per_car
+
+    # every driver has a base pace per sector, plus noise and the occasional slow (traffic, pit) lap
+    base_sectors = rng.normal([30_000, 35_000, 28_000], 400, size=(cars * drivers_per_car, 3))
+    sectors = base_sectors[driver] + rng.gamma(2.0, 250, size=(len(car), 3))
+    slow_laps = rng.random(len(car)) < 0.03
+    sectors[slow_laps, 2] += rng.uniform(5_000, 40_000, size=slow_laps.sum())
+    sectors = sectors.round().astype(np.int64)
+    lap_time = sectors.sum(axis=1)
+
+    df = pd.DataFrame({
+        "NUMBER": car + 1,
+        "DRIVER_NAME": pd.Series(driver).map(lambda driver_id: f"Driver Name {driver_id:03d}"),
+        "TEAM": pd.Series(car // 2).map(lambda team_id: f"Team {team_id:02d}"),
+        "LAP_NUMBER": lap_number,
+        "LAP_TIME": format_times(lap_time, np.ones(len(car), dtype=bool)),
+    })
+    # timing exports write sector times with and without the leading "0:" depending on the source
+    for sector in range(3):
+        with_minutes = rng.random(len(car)) < 0.5
+        df[f"S{sector + 1}"] = format_times(sectors[:, sector], with_minutes)
+        df[f"S{sector + 1}_LARGE"] = format_times(sectors[:, sector], ~with_minutes)
+
+    # a few laps are missing from the export
+    return df[rng.random(len(df)) > 0.01].reset_index(drop=True)[COLUMNS]
+
+
+def timing_csv(size: str, column_separator: str, seed: int = 0) -> bytes:
+    cars, drivers_per_car, laps = RACE_SIZES[size]
+    return generate_timing_sheet(cars, drivers_per_car, laps, seed).to_csv(
+        sep=column_separator, index=False).encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic timing sheet.")
+    parser.add_argument("size", choices=sorted(RACE_SIZES))
+    parser.add_argument("output", help="path of the CSV to write")
+    parser.add_argument("--sep", default=";", choices=[",", ";"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    with open(args.output, "wb") as csv_file:
+        csv_file.write(timing_csv(args.size, args.sep, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,226 @@
-import io
-import re
-import base64
+import binascii
+import logging
+import hashlib
+import os
+import numpy as np
 import pandas as pd
-from datetime import datetime
 import plotly.graph_objs as go
 
 
 import dash_bootstrap_components as dbc
-from dash import Dash, html, dcc, dash_table
-from dash.dependencies import Input, Output, State
+from dash import Dash, callback_context, html, dcc, dash_table, no_update
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+
+import analysis
+from dataset_cache import HAS_PARQUET, dataset_cache, is_dataset_id
+from ingest import REQUIRED_COLUMNS, read_timing_upload
+from instrumentation import instrument_callbacks, stage
+from jobs import job_manager, report_progress
+from live import live_sessions
+from memo import result_cache
+from session_store import session_store
+from table_query import page_records
+
+logger = logging.getLogger(__name__)
+
+# longer races are shown as medians over runs of laps, and cell labels are left out above
+# HEATMAP_TEXT_MAX_CELLS cells, where they'd be unreadable anyway
+HEATMAP_MAX_LAPS = int(os.environ.get("HEATMAP_MAX_LAPS", "200"))
+HEATMAP_TEXT_MAX_CELLS = int(os.environ.get("HEATMAP_TEXT_MAX_CELLS", "3000"))
+HEATMAP_COLORSCALE = 'Aggrnyl'
+# lap matrices up to this many cells are sent to the browser once and filtered there when the lap
+# slider or team filter change (assets/sequence_analysis.js), larger ones are filtered on the server
+CLIENTSIDE_MATRIX_MAX_CELLS = int(os.environ.get("CLIENTSIDE_MATRIX_MAX_CELLS", "40000"))
+
+# how often callbacks running in the background check their job
+JOB_POLL_MS = 500
+
+LIVE_REFRESH_MS = 1000
+
+# lap tables only receive the visible page from the server, see page_records
+SERVER_SIDE_TABLE = dict(page_current=0, page_size=20, page_action='custom',
+                         sort_action='custom', sort_mode='multi', sort_by=[],
+                         filter_action='custom', filter_query='')
+
+
+def get_dataset(dataset_id: str) -> pd.DataFrame:
+    # the id comes from the browser, anything but an id parse_contents handed out is ignored
+    if not is_dataset_id(dataset_id):
+        raise PreventUpdate
+    df = dataset_cache.get(dataset_id)
+    if df is None:
+        df = session_store.load(dataset_id)
+        if df is None:
+            # evicted and not stored on disk, the user has to upload the file again
+            raise PreventUpdate
+        dataset_cache.put(dataset_id, df)
+    return df
+
+
+def session_label(entry: dict) -> str:
+    return " - ".join(part for part in (entry["event"], entry["session"]) if part)
+
+
+def stored_session_options() -> list:
+    return [{'label': f"{session_label(entry)} ({len(entry['drivers'])} drivers, {entry['laps']} laps)",
+             'value': entry['dataset_id']}
+            for entry in session_store.entries()]
+
+
+def preview_columns(df: pd.DataFrame) -> list:
+    # the uploaded columns, without the parsed *_MS columns added at import
+    return [column for column in df.columns if column in REQUIRED_COLUMNS]
+
+
+@result_cache.memoize(key=lambda dataset_id: dataset_id)
+def lap_analysis(dataset_id: str):
+    df = get_dataset(dataset_id)
+    report_progress(0.2, "Fastest laps")
+    df_fastest_lap_per_driver = analysis.fastest_lap(df)
+    report_progress(0.5, "Ideal laps")
+    df_ideal_lap_per_driver = analysis.ideal_lap(df, df_fastest_lap_per_driver)
+    report_progress(0.8, "Positions")
+    return (analysis.fastest_lap_table(df_fastest_lap_per_driver),
+            analysis.ideal_lap_table(df_ideal_lap_per_driver),
+            analysis.position_deltas(df_fastest_lap_per_driver, df_ideal_lap_per_driver))
+
+
+@result_cache.memoize(key=lambda dataset_id, lap_range, teams: (dataset_id, tuple(lap_range),
+                                                                tuple(sorted(teams or [], key=str))))
+def sequence_matrix(dataset_id: str, lap_range: list, teams: list):
+    df = get_dataset(dataset_id)
+    report_progress(0.2, "Filtering laps")
+    df = analysis.filter_laps(df, lap_range, teams or [])
+    report_progress(0.5, "Lap matrix")
+    return analysis.lap_sequence_matrix(df)
+
+
+def filtered_in_browser(df: pd.DataFrame) -> bool:
+    """Whether the lap matrix of ``df`` is sent to the browser, decided without building it.
+
+    Not if the matrix is too large or a driver drove for several teams (the team filter then works
+    per lap, not per driver).
+    """
+    cells = df["DRIVER_NAME"].nunique() * df["LAP_NUMBER"].nunique()
+    team_counts = df.groupby("DRIVER_NAME", observed=True)["TEAM"].nunique()
+    return cells <= CLIENTSIDE_MATRIX_MAX_CELLS and not (team_counts > 1).any()
+
+
+@result_cache.memoize(key=lambda dataset_id: dataset_id)
+def sequence_matrix_data(dataset_id: str) -> dict:
+    """The complete lap matrix with the team of every driver, as filtered by assets/sequence_analysis.js."""
+    df = get_dataset(dataset_id)
+    report_progress(0.2, "Lap matrix")
+    lap_times, _ = analysis.lap_sequence_matrix(df)
+    report_progress(0.6, "Lap times")
+    laps = df[df["LAP_NUMBER"].notna()].drop_duplicates(subset=["DRIVER_NAME", "LAP_NUMBER"]) \
+        .set_index(["DRIVER_NAME", "LAP_NUMBER"])
+    # None where a driver has no lap, "-" where the lap has no time
+    lap_texts = laps["LAP_TIME"].fillna("-").unstack("LAP_NUMBER").reindex_like(lap_times)
+    driver_teams = df.groupby("DRIVER_NAME", observed=True)["TEAM"].first().reindex(lap_times.index)
+    return {"dataset_id": dataset_id,
+            "drivers": lap_times.index.astype(str).tolist(),
+            "driver_teams": driver_teams.astype(str).tolist(),
+            "laps": lap_times.columns.astype(int).tolist(),
+            "times": lap_times.astype(object).where(lap_times.notna(), None).to_numpy().tolist(),
+            "texts": lap_texts.astype(object).where(lap_texts.notna(), None).to_numpy().tolist(),
+            "max_laps": HEATMAP_MAX_LAPS,
+            "text_max_cells": HEATMAP_TEXT_MAX_CELLS,
+            # plotly.js doesn't know the named colour scales of plotly.py
+            "colorscale": [list(step) for step in go.Heatmap(colorscale=HEATMAP_COLORSCALE).colorscale]}
+
+
+@result_cache.memoize(key=lambda dataset_ids: tuple(dataset_ids))
+def session_comparison(dataset_ids: list) -> pd.DataFrame:
+    """analysis.compare_sessions of stored sessions, labelled by dataset id (see comparison_labels)."""
+    sessions = {}
+    for dataset_id in dataset_ids:
+        df = session_store.load(dataset_id, columns=analysis.COMPARISON_COLUMNS)
+        if df is not None:
+            sessions[dataset_id] = df
+    return analysis.compare_sessions(sessions)
+
+
+def comparison_labels(dataset_ids: list) -> dict:
+    # read from the index on every call, uploading a session again can change its event and name
+    labels = {}
+    for dataset_id in dataset_ids:
+        entry = session_store.entry(dataset_id)
+        label = session_label(entry) if entry is not None else dataset_id[:7]
+        if label in labels.values():
+            label = f"{label} ({dataset_id[:7]})"
+        labels[dataset_id] = label
+    return labels
+
+
+def job_outputs(job_key: tuple, function, args: tuple, job_id: str, polled: bool, render, dataset_id: str):
+    """Outputs (children, job id, poll interval disabled, progress) of a callback computing in the background.
+
+    New inputs submit a job and release the one they supersede; polls show the progress until the
+    job is done and then ``render`` its result. ``dataset_id`` is the dataset the job reads.
+    """
+    with stage("aggregate"):
+        if not polled or job_id not in job_manager:
+            # job processes load the dataset from the session store, one that's only in this worker's
+            # memory (it couldn't be stored) has to be analysed here
+            inline = dataset_id not in session_store
+            # polls can reach a web worker that doesn't know the job, it's simply submitted there
+            new_job_id = job_manager.submit(job_key, function, *args, inline=inline)
+            if job_id is not None and job_id != new_job_id:
+                job_manager.release(job_id)
+            job_id = new_job_id
+
+    if not job_manager.done(job_id):
+        fraction, message = job_manager.progress(job_id)
+        return no_update, job_id, False, dbc.Progress(value=int(fraction * 100), label=message,
+                                                      striped=True, animated=True)
+    try:
+        result = job_manager.result(job_id)
+    except Exception:
+        # including PreventUpdate from get_dataset, e.g. for a dataset no longer cached or stored
+        logger.exception("Background job %s failed", job_key)
+        # shown in place of the progress bar, the output may be a store (sequence-matrix)
+        return None, None, True, html.Div(['ERROR: Could not analyse the data...'])
+    with stage("figure"):
+        return render(result), None, True, None
+
+
+def lap_sequence_figure(lap_times_per_driver: pd.DataFrame, text_lap_times_per_driver: pd.DataFrame) -> dict:
+    lap_times_per_driver, laps_per_column = analysis.downsample_laps(lap_times_per_driver, HEATMAP_MAX_LAPS)
+    # seconds rounded to tenths: finer colour steps aren't visible but make the JSON much longer
+    lap_times = np.round(lap_times_per_driver.to_numpy(dtype=np.float64) / 1000, 1)
+    heatmap = dict(z=lap_times,
+                   x=lap_times_per_driver.columns.to_numpy(dtype=np.int32),
+                   y=lap_times_per_driver.index.astype(str).str[:10].to_numpy(),
+                   colorscale=HEATMAP_COLORSCALE,
+                   showscale=False,
+                   hoverongaps=False,
+                   hovertemplate="%{y} lap %{x}: %{z:.1f} s<extra></extra>")
+    if laps_per_column == 1 and lap_times.size <= HEATMAP_TEXT_MAX_CELLS:
+        heatmap.update(text=text_lap_times_per_driver.to_numpy(),
+                       texttemplate="%{text}",
+                       textfont={"size": 15},
+                       hovertemplate="%{y} lap %{x}: %{text}<extra></extra>")
+
+    x_title = 'LAP NUMBER' if laps_per_column == 1 else f'LAP NUMBER (median of {laps_per_column} laps)'
+    return {'data': [go.Heatmap(**heatmap)],
+            'layout': go.Layout(
+                xaxis=dict(title=x_title),
+                height=700
+            )
+            }
+
+
+def preload_modules():
+    """Import what dash, plotly and pandas otherwise only import on the first requests."""
+    # dash serialises the layout and every callback response with plotly's JSON encoder
+    import plotly.io.json  # noqa: F401
+    # plotly.graph_objs loads the trace classes and their validators on first use
+    go.Heatmap(), go.Scattergl(), go.Bar(), go.Layout()
+    if HAS_PARQUET:
+        import pyarrow.parquet  # noqa: F401
+
 
 def create_dash_app(flask_app):
     external_stylesheets = [dbc.themes.BOOTSTRAP]
@@ -17,6 +229,7 @@ def create_dash_app(flask_app):
                    url_base_pathname='/dashboard/',
                    external_stylesheets=external_stylesheets
                    )
+    instrument_callbacks(dashapp)
 
     dashapp.layout = html.Div([
         dbc.NavbarSimple(
@@ -53,6 +266,15 @@ def create_dash_app(flask_app):
                                     value=';')],
                     width=1),
 
+            dbc.Col([html.H6("Event / Session"),
+                     dbc.Input(id='session-event', placeholder="Event", debounce=True),
+                     dbc.Input(id='session-name', placeholder="Session (default: file name)", debounce=True)],
+                    width=2),
+
+            dbc.Col([html.H6("Stored sessions"),
+                     dcc.Dropdown(id='stored-session', placeholder="Open a previously uploaded session")],
+                    width=3),
+
             dbc.Col(html.Div(id='output-filename'))
             ], align="center"),
         html.Hr(),  # horizontal line
@@ -62,12 +284,41 @@ def create_dash_app(flask_app):
         html.Hr(),  # horizontal line
 
         html.H4('Lap Analysis'),
+        dcc.Store(id='best-lap-job'),
+        dcc.Interval(id='best-lap-job-interval', interval=JOB_POLL_MS, disabled=True),
+        html.Div(id='best-lap-progress'),
         html.Div(id='best-lap-table'),
         html.Hr(),  # horizontal line
 
         html.H4('Sequence Analysis'),
         html.Div(id='lap-slider-output'),
+        dcc.Store(id='sequence-matrix'),
+        dcc.Store(id='sequence-matrix-job'),
+        dcc.Interval(id='sequence-matrix-job-interval', interval=JOB_POLL_MS, disabled=True),
+        html.Div(id='sequence-matrix-progress'),
+        dcc.Store(id='sequence-filter'),
+        dcc.Store(id='sequence-job'),
+        dcc.Interval(id='sequence-job-interval', interval=JOB_POLL_MS, disabled=True),
+        html.Div(id='sequence-progress'),
         dbc.Col(html.Div(id='output-sequence-analysis')),
+        html.Div(dcc.Graph(id='clientside-heatmap'), id='clientside-sequence-analysis', style={'display': 'none'}),
+        html.Hr(),  # horizontal line
+
+        html.H4('Session Comparison'),
+        dcc.Dropdown(id='compare-sessions', multi=True, placeholder="Select stored sessions to compare"),
+        html.Div(id='session-comparison-output'),
+        html.Hr(),  # horizontal line
+
+        html.H4('Live Timing'),
+        dbc.Row([
+            dbc.Col([html.H6("Session"),
+                     dcc.Dropdown(id='live-session', placeholder="Select a live session")],
+                    width=4)
+        ]),
+        dcc.Interval(id='live-sessions-interval', interval=10 * 1000),
+        dcc.Interval(id='live-interval', interval=LIVE_REFRESH_MS, disabled=True),
+        dcc.Store(id='live-version'),
+        html.Div(id='live-timing-output'),
         html.Hr(),  # horizontal line
 
         ], fluid=True, style={"height": "100vh"})
@@ -82,159 +333,112 @@ def create_dash_app(flask_app):
             else:
                 return dbc.Alert('ERROR: Unknown file type. Please upload a .csv file!', color="danger")
 
-    def parse_contents(contents, filename, column_separator):
-        content_type, content_string = contents.split(',')
-        decoded = base64.b64decode(content_string)
-        try:
-            if filename.endswith('.csv'):
-                df = pd.read_csv(io.StringIO(decoded.decode('utf-8')), sep=column_separator)
-            elif filename.endswith('.xlsx'):
-                df = pd.read_excel(io.BytesIO(decoded))
-            else:
-                return html.Div(['ERROR: Unknown file type. Please upload either a .csv or an .xlsx file!'])
-        except Exception as e:
-            print(e)
-            return html.Div(['ERROR: Could not read the data...'])
-
+    def dataset_preview(dataset_id, df):
         return html.Div([
             dash_table.DataTable(
-                data=df.to_dict('records'),
-                columns=[{'name': i, 'id': i} for i in df.columns],
+                id='preview-table',
+                columns=[{'name': i, 'id': i} for i in preview_columns(df)],
+                page_current=0,
                 page_size=5,
+                page_action='custom',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[],
+                filter_action='custom',
+                filter_query='',
                 style_data={'whiteSpace': 'normal',
                             'height': 'auto'},
                 style_table={'overflowX': 'scroll'}),
-            dcc.Store(id='stored-data', data=df.to_dict('records'))
+            dcc.Store(id='stored-data', data=dataset_id)
         ])
 
-    def unify_timeformat(raw_time: str) -> str:
-        raw_time = str(raw_time)
-        correct_format = re.compile('\d{1,2}:\d{2}\.\d{1,5}')
-        incorrect_format = re.compile('\d{1,2}\.\d{1,5}')
-        if correct_format.match(raw_time) is not None:
-            return raw_time
-        elif incorrect_format.match(raw_time):
-            return f"00:{raw_time}"
-
+    def parse_contents(contents, filename, column_separator, event, session):
+        # decoded from a view past the "data:...;base64," header, slicing the string would copy it
+        encoded = contents.encode('ascii')
+        decoded = binascii.a2b_base64(memoryview(encoded)[contents.index(',') + 1:])
+        del encoded
+        # same file and separator always map to the same dataset, so re-uploads hit the cache
+        digest = hashlib.sha1(decoded)
+        digest.update(column_separator.encode('utf-8'))
+        dataset_id = digest.hexdigest()
+        df = dataset_cache.get(dataset_id)
+        if df is None and dataset_id in session_store:
+            df = get_dataset(dataset_id)
+        if df is None:
+            if not (filename.endswith('.csv') or filename.endswith('.xlsx')):
+                return html.Div(['ERROR: Unknown file type. Please upload either a .csv or an .xlsx file!'])
+            try:
+                with stage("parse"):
+                    df, report = read_timing_upload(decoded, filename, column_separator)
+            except ValueError as e:
+                # e.g. missing columns, the message says which
+                logger.warning("Could not read %s: %s", filename, e)
+                return html.Div([f'ERROR: Could not read the data: {e}'])
+            except Exception:
+                logger.exception("Could not read %s", filename)
+                return html.Div(['ERROR: Could not read the data...'])
+            logger.info("Imported %s: %s", filename, report)
+            dataset_cache.put(dataset_id, df)
+        # (re)index with the event and session given with this upload
+        session_store.save(dataset_id, df, event, session, filename)
+
+        return dataset_preview(dataset_id, df)
 
     @dashapp.callback(Output('output-datatable', 'children'),
                       Input('upload-data', 'contents'),
                       State('upload-data', 'filename'),
-                      Input('column-separator-id', 'value'))
-    def show_inital_table(list_of_contents, list_of_names, separator):
+                      Input('column-separator-id', 'value'),
+                      Input('stored-session', 'value'),
+                      State('session-event', 'value'),
+                      State('session-name', 'value'))
+    def show_inital_table(list_of_contents, list_of_names, separator, stored_session, event, session):
+        triggered = [trigger['prop_id'] for trigger in callback_context.triggered]
+        if stored_session is not None and 'stored-session.value' in triggered:
+            return [dataset_preview(stored_session, get_dataset(stored_session))]
         if list_of_contents is not None:
-            children = [parse_contents(list_of_contents, list_of_names, separator)]
+            children = [parse_contents(list_of_contents, list_of_names, separator, event, session)]
             return children
 
-    @dashapp.callback(Output('best-lap-table', 'children'),
-                      Input('stored-data', 'data'))
-    def best_lap(raw_data: dict):
-        df = pd.DataFrame(raw_data)
-        for time_column in ["LAP_TIME", "S1", "S2", "S3", "S1_LARGE", "S2_LARGE", "S3_LARGE"]:
-            df[time_column] = df[time_column].apply(unify_timeformat)
-            df[time_column] = pd.to_datetime(df[time_column], format='%M:%S.%f').dt.time
-
-        # fastest lap per driver
-        df_fastest_lap_per_driver = df.groupby(["NUMBER", "DRIVER_NAME"]).agg({"LAP_TIME": "min"}).reset_index()
-        df_fastest_lap_per_driver.columns = ["NUMBER", "DRIVER_NAME", "LAP_TIME"]
-        df_fastest_lap_per_driver["Fastest_lap_per_driver"] = df_fastest_lap_per_driver["LAP_TIME"]
-
-        df_fastest_lap_full_data = pd.merge(df, df_fastest_lap_per_driver, how="inner",
-                                            on=["NUMBER", "DRIVER_NAME", "LAP_TIME"])
-        df_fastest_lap_relevant_data = df_fastest_lap_full_data[
-            ["DRIVER_NAME", "S1", "S2", "S3", "LAP_TIME"]].sort_values(by="LAP_TIME", ascending=True)
-        df_fastest_lap_relevant_data["P"] = [i for i in range(1, len(df_fastest_lap_relevant_data) + 1)]
-        df_fastest_lap_relevant_data["GAP"] = pd.to_timedelta(
-            df_fastest_lap_relevant_data["LAP_TIME"].astype(str)) - pd.to_timedelta(
-            df_fastest_lap_relevant_data["LAP_TIME"].astype(str)).min()
-        df_fastest_lap_relevant_data["GAP"] = df_fastest_lap_relevant_data["GAP"].astype(str).map(lambda x: x[7:])
-
-        for column in ["S1", "S2", "S3", "LAP_TIME", "GAP"]:
-            df_fastest_lap_relevant_data[column] = df_fastest_lap_relevant_data[column].astype(str).map(lambda x: x[3:-3])
-        df_fastest_lap_relevant_data = df_fastest_lap_relevant_data[["P", "DRIVER_NAME", "S1", "S2", "S3", "LAP_TIME", "GAP"]]
-
-        position_fastest_lap = df_fastest_lap_relevant_data[["DRIVER_NAME", "P"]]
-        position_fastest_lap.columns = ["DRIVER_NAME", "P_fastest"]
-
-        # ideal lap calculation
-        df_ideal_lap_per_driver = df.groupby(["NUMBER", "DRIVER_NAME"]).agg(
-            {"S1": "min", "S2": "min", "S3": "min"}).reset_index()
-        df_ideal_lap_per_driver["IDEAL_LAP"] = (pd.to_timedelta(df_ideal_lap_per_driver["S1"].astype(str)) + \
-                                                pd.to_timedelta(df_ideal_lap_per_driver["S2"].astype(str)) + \
-                                                pd.to_timedelta(df_ideal_lap_per_driver["S3"].astype(str))).astype(str)
-
-        df_ideal_lap_per_driver["IDEAL_LAP"] = df_ideal_lap_per_driver["IDEAL_LAP"].map(lambda x: x[7:])
-        df_ideal_lap_per_driver = df_ideal_lap_per_driver.sort_values(by="IDEAL_LAP", ascending=True)
-        df_ideal_lap_per_driver["P"] = [i for i in range(1, len(df_ideal_lap_per_driver) + 1)]
-
-        df_ideal_lap_per_driver["GAP"] = pd.to_timedelta(
-            df_ideal_lap_per_driver["IDEAL_LAP"].astype(str)) - pd.to_timedelta(
-            df_ideal_lap_per_driver["IDEAL_LAP"].astype(str)).min()
-
-        df_ideal_lap_per_driver["IDEAL_VS_FASTEST"] = pd.to_timedelta(
-            df_fastest_lap_per_driver["Fastest_lap_per_driver"].astype(str)) - df_ideal_lap_per_driver["IDEAL_LAP"]
-        df_ideal_lap_per_driver["IDEAL_VS_FASTEST"] = df_ideal_lap_per_driver["IDEAL_VS_FASTEST"].astype(str).map(
-            lambda x: x[10:-3])
-
-        df_ideal_lap_per_driver["GAP"] = df_ideal_lap_per_driver["GAP"].astype(str).map(lambda x: x[7:])
-
-        for column in ["S1", "S2", "S3", "IDEAL_LAP", "GAP"]:
-            df_ideal_lap_per_driver[column] = df_ideal_lap_per_driver[column].astype(str).map(lambda x: x[3:-3])
-        df_ideal_lap_per_driver = df_ideal_lap_per_driver[["P", "DRIVER_NAME", "S1", "S2", "S3", "IDEAL_LAP", "GAP", "IDEAL_VS_FASTEST"]]
-
-
-        # position change: all improve from fastest to ideal
-        position_ideal_lap = df_ideal_lap_per_driver[["DRIVER_NAME", "P"]]
-        position_ideal_lap.columns = ["DRIVER_NAME", "P_ideal"]
-        position_fastest_vs_ideal = pd.merge(position_fastest_lap, position_ideal_lap, how="inner", on="DRIVER_NAME")
-
-        # position change: only you improve from fastest to ideal
-        ideal_position = {}
-        for index, row in df_ideal_lap_per_driver.iterrows():
-            df_base = df_fastest_lap_relevant_data.copy()
-            ideal_driver_time = row["IDEAL_LAP"]
-            driver = row["DRIVER_NAME"]
-
-            df_base.loc[df_base.DRIVER_NAME == driver, "LAP_TIME"] = ideal_driver_time
-
-            df_base = df_base.sort_values(by="LAP_TIME", ascending=True)
-            df_base["P"] = [i for i in range(1, len(df_base) + 1)]
-            ideal_position[driver] = df_base.loc[df_base.DRIVER_NAME == driver, "P"].values[0]
-
-        position_fastest_vs_ideal["your_ideal_position"] = position_fastest_vs_ideal.DRIVER_NAME.map(ideal_position)
+    def best_lap_layout(lap_analysis_result):
+        df_fastest_lap_relevant_data, df_ideal_lap_relevant_data, position_fastest_vs_ideal = lap_analysis_result
+        p_fastest = position_fastest_vs_ideal["P_fastest"].to_numpy(dtype=np.int32)
+        p_ideal = position_fastest_vs_ideal["P_ideal"].to_numpy(dtype=np.int32)
+        p_potential = position_fastest_vs_ideal["your_ideal_position"].to_numpy(dtype=np.int32)
+        driver_names = position_fastest_vs_ideal["DRIVER_NAME"].astype(str).to_numpy()
+        driver_labels = position_fastest_vs_ideal["DRIVER_NAME"].astype(str).str[:10].to_numpy()
 
         return html.Div([dbc.Row(
                                 [dbc.Col(
                                     [html.H5("Fastest Lap", style={"textAlign": "center"}), dash_table.DataTable(
-                                        data=df_fastest_lap_relevant_data.to_dict('records'),
+                                        id='fastest-lap-table',
                                         columns=[{'name': i, 'id': i} for i in df_fastest_lap_relevant_data.columns],
-                                        page_size=20)],
+                                        **SERVER_SIDE_TABLE)],
                                     width=6),
 
                                     dbc.Col(
                                         [html.H5("Ideal Lap", style={"textAlign": "center"}), dash_table.DataTable(
-                                            data=df_ideal_lap_per_driver.to_dict('records'),
-                                            columns=[{'name': i, 'id': i} for i in df_ideal_lap_per_driver.columns],
-                                            page_size=20)],
+                                            id='ideal-lap-table',
+                                            columns=[{'name': i, 'id': i} for i in df_ideal_lap_relevant_data.columns],
+                                            **SERVER_SIDE_TABLE)],
                                         width=6)
                                 ]),
             dbc.Row([
                 dbc.Col([html.Br(),
                          html.H5("Fastest vs Ideal", style={"textAlign": "center"}),
                          dcc.Graph(id='fastest-vs-ideal-all',
-                                   figure={'data': [go.Scatter(
-                                                      x=position_fastest_vs_ideal["P_fastest"],
-                                                      y=position_fastest_vs_ideal["P_ideal"],
+                                   figure={'data': [go.Scattergl(
+                                                      x=p_fastest,
+                                                      y=p_ideal,
                                                       mode="markers+text",
                                                       marker={'color': 'LightSeaGreen'},
-                                                      text=position_fastest_vs_ideal["DRIVER_NAME"],
+                                                      text=driver_names,
                                                       textposition='top center',
                                                       texttemplate="%{text}",
                                                       textfont={"size": 10},
                                                       name="drivers",
-                                   ), go.Scatter(
-                                                      x=position_fastest_vs_ideal["P_fastest"],
-                                                      y=position_fastest_vs_ideal["P_fastest"],
+                                   ), go.Scattergl(
+                                                      x=p_fastest,
+                                                      y=p_fastest,
                                                       mode="lines",
                                                       marker={'color': 'Aquamarine'},
                                                       name="45° line",
@@ -252,19 +456,19 @@ def create_dash_app(flask_app):
                 dbc.Col([html.Br(),
                          html.H5("Fastest vs Potential", style={"textAlign": "center"}),
                          dcc.Graph(id='fastest-vs-ideal-only_you',
-                                   figure={'data': [go.Scatter(
-                                       x=position_fastest_vs_ideal["P_fastest"],
-                                       y=position_fastest_vs_ideal["your_ideal_position"],
+                                   figure={'data': [go.Scattergl(
+                                       x=p_fastest,
+                                       y=p_potential,
                                        mode="markers+text",
                                        marker={'color': 'MidnightBlue'},
                                        name="drivers",
-                                       text=position_fastest_vs_ideal["DRIVER_NAME"],
+                                       text=driver_names,
                                        textposition='top center',
                                        texttemplate="%{text}",
                                        textfont={"size": 10},
-                                   ), go.Scatter(
-                                       x=position_fastest_vs_ideal["P_fastest"],
-                                       y=position_fastest_vs_ideal["P_fastest"],
+                                   ), go.Scattergl(
+                                       x=p_fastest,
+                                       y=p_fastest,
                                        marker={'color': 'LightSkyBlue'},
                                        name="45° line"
 
@@ -282,9 +486,9 @@ def create_dash_app(flask_app):
         # Difference in Positions
             dbc.Row([dbc.Col(dcc.Graph(id='difference-fastest-vs-ideal-all',
                                    figure={'data': [go.Bar(
-                                       x=position_fastest_vs_ideal["DRIVER_NAME"].str[:10],
-                                       y=position_fastest_vs_ideal["P_fastest"] - position_fastest_vs_ideal["P_ideal"],
-                                       text=position_fastest_vs_ideal["P_fastest"] - position_fastest_vs_ideal["P_ideal"],
+                                       x=driver_labels,
+                                       y=p_fastest - p_ideal,
+                                       text=p_fastest - p_ideal,
                                        textposition='outside',
                                        texttemplate="%{text}",
                                        textfont=dict(
@@ -305,9 +509,9 @@ def create_dash_app(flask_app):
                 dbc.Col([
                          dcc.Graph(id='difference-fastest-vs-ideal-only_you',
                                    figure={'data': [go.Bar(
-                                       x=position_fastest_vs_ideal["DRIVER_NAME"].str[:10],
-                                       y=position_fastest_vs_ideal["P_fastest"] - position_fastest_vs_ideal["your_ideal_position"],
-                                       text=position_fastest_vs_ideal["P_fastest"] - position_fastest_vs_ideal["your_ideal_position"],
+                                       x=driver_labels,
+                                       y=p_fastest - p_potential,
+                                       text=p_fastest - p_potential,
                                        textposition='outside',
                                        texttemplate="%{text}",
                                        textfont=dict(
@@ -328,67 +532,112 @@ def create_dash_app(flask_app):
             ], style={"height": "5%"})
         ])
 
-    @dashapp.callback(Output('output-sequence-analysis', 'children'),
+    @dashapp.callback(Output('best-lap-table', 'children'),
+                      Output('best-lap-job', 'data'),
+                      Output('best-lap-job-interval', 'disabled'),
+                      Output('best-lap-progress', 'children'),
                       Input('stored-data', 'data'),
-                      Input('my-slider', 'value'),
-                      Input('team-filter', 'value'))
-    def sequence_analysis(raw_data: dict, slider_value: int, relevant_teams: list):
-        df = pd.DataFrame(raw_data)
-        df.sort_values(by=["DRIVER_NAME", "LAP_NUMBER"], inplace=True)
-        print("HEEEELLO")
-        print(slider_value)
-        df = df[(df.LAP_NUMBER >= slider_value[0]) & (df.LAP_NUMBER <= slider_value[1])]
-        df = df[df.TEAM.isin(relevant_teams)]
-
-        drivers = list(df["DRIVER_NAME"].unique())
-        drivers_label = []
-        laps = list(df["LAP_NUMBER"].unique())
-        lap_times_per_driver = []
-        text_lap_times_per_driver = []
-
-        for driver in drivers:
-            drivers_label.append(driver[:10])
-            times_per_driver = []
-            raw_times = []
-            for lap in laps:
-                lap_time = df[(df["DRIVER_NAME"] == driver) & (df["LAP_NUMBER"] == lap)]["LAP_TIME"].values
-                if len(lap_time) == 0:
-                    lap_time = None
-                    raw_time = "-"
-                else:
-                    lap_time = lap_time[0]
-                    raw_time = lap_time
-                    lap_time = datetime.strptime(lap_time, '%M:%S.%f').time().microsecond
-
-                times_per_driver.append(lap_time)
-                raw_times.append(raw_time)
-            lap_times_per_driver.append(times_per_driver)
-            text_lap_times_per_driver.append(raw_times)
-
-        return dcc.Graph( id='heatmap',
-                          figure={'data': [go.Heatmap(z=lap_times_per_driver,
-                                                      x=laps,
-                                                      y=drivers_label,
-                                                      text=text_lap_times_per_driver,
-                                                      texttemplate="%{text}",
-                                                      textfont={"size": 15},
-                                                      colorscale='Aggrnyl',
-                                                      showscale=False,
-                                                      hoverongaps=False)],
-                                  'layout': go.Layout(
-                                      xaxis=dict(title='LAP NUMBER'),
-                                      height=700
-                                  )
-                          }
-                  )
+                      Input('best-lap-job-interval', 'n_intervals'),
+                      State('best-lap-job', 'data'))
+    def best_lap(dataset_id: str, n_intervals: int, job_id: str):
+        if dataset_id is None:
+            raise PreventUpdate
+        polled = [trigger['prop_id'] for trigger in callback_context.triggered] == ['best-lap-job-interval.n_intervals']
+        return job_outputs(("lap_analysis", dataset_id), lap_analysis, (dataset_id,), job_id, polled, best_lap_layout,
+                           dataset_id)
+
+    @dashapp.callback(Output('preview-table', 'data'),
+                      Output('preview-table', 'page_count'),
+                      Input('stored-data', 'data'),
+                      Input('preview-table', 'page_current'),
+                      Input('preview-table', 'page_size'),
+                      Input('preview-table', 'sort_by'),
+                      Input('preview-table', 'filter_query'))
+    def preview_page(dataset_id: str, page_current: int, page_size: int, sort_by: list, filter_query: str):
+        df = get_dataset(dataset_id)
+        with stage("aggregate"):
+            return page_records(df, page_current, page_size, sort_by, filter_query, columns=preview_columns(df))
+
+    @dashapp.callback(Output('fastest-lap-table', 'data'),
+                      Output('fastest-lap-table', 'page_count'),
+                      Input('stored-data', 'data'),
+                      Input('fastest-lap-table', 'page_current'),
+                      Input('fastest-lap-table', 'page_size'),
+                      Input('fastest-lap-table', 'sort_by'),
+                      Input('fastest-lap-table', 'filter_query'))
+    def fastest_lap_page(dataset_id: str, page_current: int, page_size: int, sort_by: list, filter_query: str):
+        with stage("aggregate"):
+            df_fastest_lap_relevant_data, _, _ = lap_analysis(dataset_id)
+            return page_records(df_fastest_lap_relevant_data, page_current, page_size, sort_by, filter_query)
+
+    @dashapp.callback(Output('ideal-lap-table', 'data'),
+                      Output('ideal-lap-table', 'page_count'),
+                      Input('stored-data', 'data'),
+                      Input('ideal-lap-table', 'page_current'),
+                      Input('ideal-lap-table', 'page_size'),
+                      Input('ideal-lap-table', 'sort_by'),
+                      Input('ideal-lap-table', 'filter_query'))
+    def ideal_lap_page(dataset_id: str, page_current: int, page_size: int, sort_by: list, filter_query: str):
+        with stage("aggregate"):
+            _, df_ideal_lap_relevant_data, _ = lap_analysis(dataset_id)
+            return page_records(df_ideal_lap_relevant_data, page_current, page_size, sort_by, filter_query)
+
+    dashapp.clientside_callback(ClientsideFunction(namespace='sequence_analysis', function_name='filter_heatmap'),
+                                Output('clientside-heatmap', 'figure'),
+                                Output('clientside-sequence-analysis', 'style'),
+                                Output('output-sequence-analysis', 'style'),
+                                Output('sequence-filter', 'data'),
+                                Input('my-slider', 'value'),
+                                Input('team-filter', 'value'),
+                                Input('sequence-matrix', 'data'),
+                                State('stored-data', 'data'))
+
+    @dashapp.callback(Output('sequence-matrix', 'data'),
+                      Output('sequence-matrix-job', 'data'),
+                      Output('sequence-matrix-job-interval', 'disabled'),
+                      Output('sequence-matrix-progress', 'children'),
+                      Input('stored-data', 'data'),
+                      Input('sequence-matrix-job-interval', 'n_intervals'),
+                      State('sequence-matrix-job', 'data'))
+    def sequence_matrix_store(dataset_id: str, n_intervals: int, job_id: str):
+        polled = [trigger['prop_id'] for trigger in callback_context.triggered] == \
+                 ['sequence-matrix-job-interval.n_intervals']
+        if not polled and not filtered_in_browser(get_dataset(dataset_id)):
+            # filtered on the server, the complete matrix is never built
+            if job_id is not None:
+                job_manager.release(job_id)
+            return {"dataset_id": dataset_id}, None, True, None
+        return job_outputs(("sequence_matrix_data", dataset_id), sequence_matrix_data, (dataset_id,), job_id, polled,
+                           lambda matrix: matrix, dataset_id)
+
+    # only reached for lap matrices too large to filter in the browser, see filtered_in_browser
+    @dashapp.callback(Output('output-sequence-analysis', 'children'),
+                      Output('sequence-job', 'data'),
+                      Output('sequence-job-interval', 'disabled'),
+                      Output('sequence-progress', 'children'),
+                      Input('sequence-filter', 'data'),
+                      Input('sequence-job-interval', 'n_intervals'),
+                      State('sequence-job', 'data'))
+    def sequence_analysis(sequence_filter: dict, n_intervals: int, job_id: str):
+        if sequence_filter is None:
+            raise PreventUpdate
+        dataset_id, slider_value, relevant_teams = (sequence_filter["dataset_id"], sequence_filter["lap_range"],
+                                                    sequence_filter["teams"])
+        polled = [trigger['prop_id'] for trigger in callback_context.triggered] == ['sequence-job-interval.n_intervals']
+        # a newer slider or team selection releases the job of the previous one, which cancels it
+        job_key = ("sequence_matrix", dataset_id, tuple(slider_value), tuple(sorted(relevant_teams or [], key=str)))
+        return job_outputs(job_key, sequence_matrix, (dataset_id, slider_value, relevant_teams), job_id, polled,
+                           lambda matrices: dcc.Graph(id='heatmap', figure=lap_sequence_figure(*matrices)), dataset_id)
+
     @dashapp.callback(Output('lap-slider-output', 'children'),
                       Input('stored-data', 'data'))
-    def lap_slider(raw_data: dict):
-        df = pd.DataFrame(raw_data)
+    def lap_slider(dataset_id: str):
+        df = get_dataset(dataset_id)
         teams = list(df.TEAM.unique())
 
-        minimum_slider_value = df.LAP_NUMBER.min()
-        maximum_slider_value = df.LAP_NUMBER.max()
+        # a sheet without any lap number gets a slider over lap 1 only
+        minimum_slider_value = int(df.LAP_NUMBER.min()) if df.LAP_NUMBER.notna().any() else 1
+        maximum_slider_value = int(df.LAP_NUMBER.max()) if df.LAP_NUMBER.notna().any() else 1
 
         return dbc.Row([dbc.Col([html.H6("Teams", style={"textAlign": "center"}),
                                  dcc.Dropdown(teams, teams,
@@ -401,3 +650,98 @@ def create_dash_app(flask_app):
                                                  id='my-slider')
                                  ])
                         ])
+
+    @dashapp.callback(Output('stored-session', 'options'),
+                      Output('compare-sessions', 'options'),
+                      Input('output-datatable', 'children'))
+    def stored_sessions(preview):
+        options = stored_session_options()
+        return options, options
+
+    @dashapp.callback(Output('session-comparison-output', 'children'),
+                      Input('compare-sessions', 'value'))
+    def compare_sessions(dataset_ids: list):
+        dataset_ids = [dataset_id for dataset_id in dataset_ids or [] if is_dataset_id(dataset_id)]
+        if not dataset_ids:
+            return None
+        with stage("aggregate"):
+            comparison = session_comparison(dataset_ids).rename(columns=comparison_labels(dataset_ids), level=0)
+        if comparison.empty:
+            return html.Div(['The selected sessions are no longer stored.'])
+
+        with stage("figure"):
+            table = analysis.session_comparison_table(comparison)
+            drivers = comparison.index.str[:10].to_numpy()
+            traces = []
+            for label in comparison.columns.get_level_values(0).unique():
+                traces.append(go.Scattergl(x=drivers,
+                                           y=np.round(comparison[label, "LAP_TIME_MS"].to_numpy() / 1000, 3),
+                                           mode='markers',
+                                           name=f"{label} fastest"))
+                traces.append(go.Scattergl(x=drivers,
+                                           y=np.round(comparison[label, "IDEAL_LAP_MS"].to_numpy() / 1000, 3),
+                                           mode='markers',
+                                           marker=dict(symbol='x'),
+                                           name=f"{label} ideal"))
+            return html.Div([
+                dash_table.DataTable(data=table.to_dict('records'),
+                                     columns=[{'name': i, 'id': i} for i in table.columns],
+                                     page_size=20,
+                                     sort_action='native',
+                                     style_table={'overflowX': 'scroll'}),
+                dcc.Graph(id='session-comparison-graph',
+                          figure={'data': traces,
+                                  'layout': go.Layout(xaxis=dict(title='DRIVER'),
+                                                      yaxis=dict(title='LAP TIME (s)'),
+                                                      height=500)})
+            ])
+
+    @dashapp.callback(Output('live-session', 'options'),
+                      Input('live-sessions-interval', 'n_intervals'))
+    def live_session_options(n_intervals: int):
+        return live_sessions.names()
+
+    @dashapp.callback(Output('live-interval', 'disabled'),
+                      Input('live-session', 'value'))
+    def toggle_live_interval(session: str):
+        return session is None
+
+    @dashapp.callback(Output('live-version', 'data'),
+                      Output('live-timing-output', 'children'),
+                      Input('live-interval', 'n_intervals'),
+                      Input('live-session', 'value'),
+                      State('live-version', 'data'))
+    def live_timing(n_intervals: int, session: str, shown_version: str):
+        if session is None:
+            return None, None
+        try:
+            live_session = live_sessions.get(session)
+            with stage("parse"):
+                version = f"{session}:{live_session.poll()}"
+        except ValueError as e:
+            # an invalid session name (it comes from the browser) or rows the parser rejects
+            logger.warning("Live session %r: %s", session, e)
+            raise PreventUpdate
+        if version == shown_version:
+            # no new laps since the last refresh
+            raise PreventUpdate
+
+        with stage("aggregate"):
+            df_fastest_lap, df_ideal_lap = live_session.lap_tables()
+            lap_times_per_driver, text_lap_times_per_driver = live_session.lap_matrix()
+        with stage("figure"):
+            return version, html.Div([
+                dbc.Row([
+                    dbc.Col([html.H5("Fastest Lap", style={"textAlign": "center"}), dash_table.DataTable(
+                        data=df_fastest_lap.to_dict('records'),
+                        columns=[{'name': i, 'id': i} for i in df_fastest_lap.columns],
+                        page_size=20)],
+                        width=6),
+                    dbc.Col([html.H5("Ideal Lap", style={"textAlign": "center"}), dash_table.DataTable(
+                        data=df_ideal_lap.to_dict('records'),
+                        columns=[{'name': i, 'id': i} for i in df_ideal_lap.columns],
+                        page_size=20)],
+                        width=6)
+                ]),
+                dcc.Graph(id='live-heatmap', figure=lap_sequence_figure(lap_times_per_driver, text_lap_times_per_driver))
+            ])
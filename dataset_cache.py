@@ -0,0 +1,70 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+# sha1 hex digests, see parse_contents; ids come back from the browser and end up in the session
+# store's file paths
+DATASET_ID = re.compile(r"[0-9a-f]{40}")
+
+
+def is_dataset_id(value) -> bool:
+    return isinstance(value, str) and DATASET_ID.fullmatch(value) is not None
+
+
+class DatasetCache:
+    """Parsed uploads keyed by dataset id, so dcc.Store only carries the id.
+
+    Frames live in an in-memory LRU bounded by ``max_bytes``, per worker process. Evicted datasets
+    and the uploads of other gunicorn workers are loaded again from the session store, see
+    dash_app.get_dataset.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def put(self, dataset_id: str, df: pd.DataFrame):
+        if not is_dataset_id(dataset_id):
+            raise ValueError(f"Invalid dataset id: {dataset_id!r}")
+        size = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self._frames[dataset_id] = df
+            self._frames.move_to_end(dataset_id)
+            self._sizes[dataset_id] = size
+            # evict least recently used frames, but always keep the newest one
+            while len(self._frames) > 1 and self.size_bytes > self.max_bytes:
+                evicted_id, _ = self._frames.popitem(last=False)
+                del self._sizes[evicted_id]
+
+    def get(self, dataset_id: str):
+        with self._lock:
+            if dataset_id not in self._frames:
+                return None
+            self._frames.move_to_end(dataset_id)
+            return self._frames[dataset_id]
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._sizes.clear()
+
+    def __contains__(self, dataset_id: str) -> bool:
+        return dataset_id in self._frames
+
+
+dataset_cache = DatasetCache(max_bytes=int(os.environ.get("DATASET_CACHE_MAX_MB", "512")) * 1024 ** 2)
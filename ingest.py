@@ -0,0 +1,108 @@
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from lap_times import TIME_COLUMNS, add_parsed_times
+
+# car numbers are identifiers ("12B", "007"), not integers
+CATEGORICAL_COLUMNS = ["NUMBER", "DRIVER_NAME", "TEAM"]
+REQUIRED_COLUMNS = ["NUMBER", "LAP_NUMBER", "DRIVER_NAME", "TEAM"] + TIME_COLUMNS
+# nullable, exports can have rows without a lap number
+COLUMN_DTYPES = {"LAP_NUMBER": "Int32",
+                 **{column: "category" for column in CATEGORICAL_COLUMNS},
+                 **{column: str for column in TIME_COLUMNS}}
+
+# uploads larger than this are parsed in chunks of CHUNK_ROWS rows
+CHUNK_THRESHOLD_BYTES = int(os.environ.get("INGEST_CHUNK_THRESHOLD_MB", "32")) * 1024 ** 2
+CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", "200000"))
+# trace the memory allocated by every parse (slows parsing down), see read_timing_upload
+TRACE_MEMORY = os.environ.get("INGEST_TRACE_MEMORY", "0") == "1"
+
+
+def peak_rss_bytes() -> int:
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def combine_chunks(chunks: list) -> pd.DataFrame:
+    if len(chunks) == 1:
+        return chunks[0]
+    df = pd.concat(chunks, ignore_index=True)
+    # concat turns categoricals with different categories into object columns, union them instead
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = union_categoricals([chunk[column] for chunk in chunks], sort_categories=True)
+    return df
+
+
+def require_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Return ``df``, raises ValueError naming the analysed columns it lacks."""
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    return df
+
+
+def read_timing_csv(source, column_separator: str, chunksize: int = None) -> pd.DataFrame:
+    """Read a timing CSV (path or binary buffer) with only the analysed columns and typed dtypes.
+
+    With ``chunksize`` the file is read and its lap times parsed chunk by chunk, so only the parser's
+    temporary columns are limited to one chunk. The raw timing strings of every chunk are kept (the
+    ``LAP_TIME`` text is shown in the heatmap, the preview and live timing) and combining the chunks
+    holds all of them plus the concatenated frame for a moment.
+    """
+    reader = pd.read_csv(source, sep=column_separator, encoding="utf-8",
+                         usecols=lambda column: column in REQUIRED_COLUMNS,
+                         dtype=COLUMN_DTYPES, chunksize=chunksize)
+    if chunksize is None:
+        return add_parsed_times(require_columns(reader))
+    with reader:
+        return combine_chunks([add_parsed_times(require_columns(chunk)) for chunk in reader])
+
+
+def read_timing_excel(source) -> pd.DataFrame:
+    return add_parsed_times(require_columns(pd.read_excel(source, usecols=lambda column: column in REQUIRED_COLUMNS,
+                                                          dtype=COLUMN_DTYPES)))
+
+
+def read_timing_upload(decoded: bytes, filename: str, column_separator: str, trace_memory: bool = TRACE_MEMORY):
+    """Parse an uploaded timing file straight from its bytes.
+
+    Returns the DataFrame and a report with the row count, the frame's memory, the parse time and
+    the process's peak RSS so far, which says little about one parse. With ``trace_memory`` it
+    also holds the peak memory allocated during this parse.
+    Raises ValueError for file types other than .csv and .xlsx and for files without the analysed columns.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        buffer = io.BytesIO(decoded)
+        if filename.endswith('.csv'):
+            chunksize = CHUNK_ROWS if len(decoded) > CHUNK_THRESHOLD_BYTES else None
+            df = read_timing_csv(buffer, column_separator, chunksize=chunksize)
+        elif filename.endswith('.xlsx'):
+            df = read_timing_excel(buffer)
+        else:
+            raise ValueError(f"Unknown file type: {filename}")
+        report = {"rows": len(df),
+                  "file_bytes": len(decoded),
+                  "frame_bytes": int(df.memory_usage(deep=True).sum()),
+                  "seconds": time.perf_counter() - start,
+                  "peak_rss_bytes": peak_rss_bytes()}
+        if trace_memory:
+            report["traced_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return df, report
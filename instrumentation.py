@@ -0,0 +1,205 @@
+import cProfile
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from dash.exceptions import PreventUpdate
+from flask import Response, request
+
+from dataset_cache import dataset_cache
+from memo import result_cache
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# with CALLBACK_PROFILE_DIR set every callback runs under cProfile and calls slower than the
+# threshold get their stats dumped there
+PROFILE_DIR = os.environ.get("CALLBACK_PROFILE_DIR")
+PROFILE_THRESHOLD_SECONDS = float(os.environ.get("CALLBACK_PROFILE_THRESHOLD_MS", "500")) / 1000
+
+_current_call = contextvars.ContextVar("current_call", default=None)
+
+
+class CallbackMetrics:
+    """Per-callback counters, kept per process (every gunicorn worker reports its own)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.prevented = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.cache_hits = defaultdict(int)
+        self.request_bytes = defaultdict(int)
+        self.response_bytes = defaultdict(int)
+        self.duration_sum = defaultdict(float)
+        self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.stage_seconds = defaultdict(float)
+
+    def record(self, name: str, call: dict):
+        with self._lock:
+            self.calls[name] += 1
+            self.prevented[name] += call["prevented"]
+            self.errors[name] += call["error"]
+            self.cache_hits[name] += call["cache_hits"]
+            self.request_bytes[name] += call["request_bytes"]
+            self.response_bytes[name] += call["response_bytes"]
+            self.duration_sum[name] += call["seconds"]
+            for index, bucket in enumerate(DURATION_BUCKETS):
+                if call["seconds"] <= bucket:
+                    self.duration_buckets[name][index] += 1
+            for stage_name, seconds in call["stages"].items():
+                self.stage_seconds[name, stage_name] += seconds
+
+    def exposition(self) -> str:
+        """The metrics in the Prometheus text format."""
+        lines = []
+
+        def metric(metric_name, metric_type, help_text, samples):
+            lines.append(f"# HELP {metric_name} {help_text}")
+            lines.append(f"# TYPE {metric_name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels.items())
+                lines.append(f"{metric_name}{{{label_text}}} {value}" if label_text else f"{metric_name} {value}")
+
+        with self._lock:
+            metric("dash_callback_calls_total", "counter", "Callback invocations.",
+                   [({"callback": name}, count) for name, count in sorted(self.calls.items())])
+            metric("dash_callback_prevented_total", "counter", "Callback invocations that did not update.",
+                   [({"callback": name}, count) for name, count in sorted(self.prevented.items())])
+            metric("dash_callback_errors_total", "counter", "Callback invocations that raised.",
+                   [({"callback": name}, count) for name, count in sorted(self.errors.items())])
+            metric("dash_callback_cache_hits_total", "counter", "Result cache hits during callbacks.",
+                   [({"callback": name}, count) for name, count in sorted(self.cache_hits.items())])
+            metric("dash_callback_request_bytes_total", "counter", "Size of the callback requests.",
+                   [({"callback": name}, count) for name, count in sorted(self.request_bytes.items())])
+            metric("dash_callback_response_bytes_total", "counter", "Size of the serialised callback responses.",
+                   [({"callback": name}, count) for name, count in sorted(self.response_bytes.items())])
+            metric("dash_callback_stage_seconds_total", "counter", "Time spent per callback stage.",
+                   [({"callback": name, "stage": stage_name}, round(seconds, 6))
+                    for (name, stage_name), seconds in sorted(self.stage_seconds.items())])
+
+            duration_samples = []
+            for name in sorted(self.calls):
+                for bucket, count in zip(DURATION_BUCKETS, self.duration_buckets[name]):
+                    duration_samples.append(({"callback": name, "le": bucket}, count))
+                duration_samples.append(({"callback": name, "le": "+Inf"}, self.calls[name]))
+            lines.append("# HELP dash_callback_duration_seconds Wall time of the callbacks including serialisation.")
+            lines.append("# TYPE dash_callback_duration_seconds histogram")
+            for labels, value in duration_samples:
+                lines.append(f'dash_callback_duration_seconds_bucket{{callback="{labels["callback"]}",'
+                             f'le="{labels["le"]}"}} {value}')
+            for name in sorted(self.calls):
+                lines.append(f'dash_callback_duration_seconds_sum{{callback="{name}"}} '
+                             f'{round(self.duration_sum[name], 6)}')
+                lines.append(f'dash_callback_duration_seconds_count{{callback="{name}"}} {self.calls[name]}')
+
+        cache_stats = result_cache.stats()
+        metric("result_cache_lookups_total", "counter", "Result cache lookups by outcome.",
+               [({"result": outcome}, cache_stats[outcome]) for outcome in ("hits", "disk_hits", "misses")])
+        metric("result_cache_entries", "gauge", "Results held in memory.", [({}, cache_stats["entries"])])
+        metric("dataset_cache_bytes", "gauge", "Memory used by the cached datasets.", [({}, dataset_cache.size_bytes)])
+        return "\n".join(lines) + "\n"
+
+
+callback_metrics = CallbackMetrics()
+
+
+@contextmanager
+def stage(stage_name: str):
+    """Time a stage ("parse", "aggregate", "figure", ...) of the running callback, no-op outside callbacks."""
+    call = _current_call.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if call is not None:
+            call["stages"][stage_name] = call["stages"].get(stage_name, 0.0) + time.perf_counter() - start
+
+
+def _timed_function(function):
+    # wraps the callback function itself, to tell its time and cache hits apart from Dash's overhead
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        call = _current_call.get()
+        hits_before = result_cache.hits + result_cache.disk_hits
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if call is not None:
+                call["function_seconds"] = time.perf_counter() - start
+                call["cache_hits"] = result_cache.hits + result_cache.disk_hits - hits_before
+    return wrapper
+
+
+def _timed_dispatch(name: str, dispatch):
+    # wraps Dash's own callback wrapper, which also serialises the outputs to JSON
+    @functools.wraps(dispatch)
+    def wrapper(*args, **kwargs):
+        call = {"stages": {}, "function_seconds": 0.0, "cache_hits": 0, "prevented": 0, "error": 0,
+                "request_bytes": request.content_length or 0, "response_bytes": 0}
+        token = _current_call.set(call)
+        profiler = cProfile.Profile() if PROFILE_DIR else None
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.enable()
+            response = dispatch(*args, **kwargs)
+            call["response_bytes"] = len(response)
+            return response
+        except PreventUpdate:
+            call["prevented"] = 1
+            raise
+        except Exception:
+            call["error"] = 1
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            call["seconds"] = time.perf_counter() - start
+            _current_call.reset(token)
+            # whatever happens outside the callback function is Dash validating and serialising the outputs
+            call["stages"]["serialize"] = max(0.0, call["seconds"] - call["function_seconds"])
+            callback_metrics.record(name, call)
+            if profiler is not None and call["seconds"] >= PROFILE_THRESHOLD_SECONDS:
+                _dump_profile(name, call["seconds"], profiler)
+    return wrapper
+
+
+def _dump_profile(name: str, seconds: float, profiler: cProfile.Profile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{int(seconds * 1000)}ms.prof")
+    profiler.dump_stats(path)
+    logger.warning("Slow callback %s took %.0f ms, profile written to %s", name, seconds * 1000, path)
+
+
+def instrument_callbacks(dashapp):
+    """Make every callback registered on ``dashapp`` from now on report to ``callback_metrics``."""
+    register_callback = dashapp.callback
+
+    @functools.wraps(register_callback)
+    def callback(*args, **kwargs):
+        registered_before = set(dashapp.callback_map)
+        register = register_callback(*args, **kwargs)
+
+        def decorator(function):
+            result = register(_timed_function(function))
+            for callback_id in set(dashapp.callback_map) - registered_before:
+                dashapp.callback_map[callback_id]["callback"] = _timed_dispatch(
+                    function.__name__, dashapp.callback_map[callback_id]["callback"])
+            return result
+        return decorator
+
+    dashapp.callback = callback
+    return dashapp
+
+
+def register_metrics_route(flask_app):
+    @flask_app.route("/metrics")
+    def metrics():
+        return Response(callback_metrics.exposition(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,154 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# worker processes for the heavy callbacks, 0 runs the jobs inline in the web worker
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# finished jobs whose result was never fetched (closed tab) are forgotten after this
+JOB_RESULT_TTL_SECONDS = 600
+
+# (shared dict, job id) inside a job worker process while a job runs
+_running_job = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def report_progress(fraction: float, message: str = ""):
+    """Report the progress of the running job, and stop it if it was cancelled. No-op outside jobs."""
+    if _running_job is None:
+        return
+    shared, job_id = _running_job
+    if shared.get(("cancelled", job_id)):
+        raise JobCancelled(job_id)
+    shared[job_id] = (fraction, message)
+
+
+def _run_job(shared, job_id: str, function, args: tuple):
+    global _running_job
+    _running_job = (shared, job_id)
+    try:
+        return function(*args)
+    finally:
+        _running_job = None
+        shared.pop(("cancelled", job_id), None)
+
+
+class Job:
+    def __init__(self, future: Future):
+        self.future = future
+        self.subscribers = 1
+        self.finished = None
+        future.add_done_callback(self._finish)
+
+    def _finish(self, future: Future):
+        self.finished = time.monotonic()
+
+
+class JobManager:
+    """Runs heavy computations in a local process pool, no broker needed.
+
+    Identical requests (same ``key``) share one job. Every ``submit`` subscribes to its job and
+    ``release`` (or fetching the ``result``) unsubscribes again. A job nobody waits for any more is
+    cancelled: if it is still queued it never starts, if it is running it stops at its next
+    ``report_progress``. Jobs are known only to the web worker process that submitted them.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._shared = None
+
+    def _start(self):
+        # started on first use, so every (forked) web worker gets its own pool
+        if self._executor is None:
+            self._shared = multiprocessing.Manager().dict()
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def submit(self, key, function, *args, inline: bool = False) -> str:
+        """Run ``function(*args)`` in the background (or join the in-flight job with the same key), returns the job id.
+
+        ``inline`` runs it in this process instead, for jobs that need data only this process has.
+        """
+        job_id = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        with self._lock:
+            self._forget_expired()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.subscribers += 1
+                return job_id
+            if self.workers > 0 and not inline:
+                self._start()
+                self._shared.pop(("cancelled", job_id), None)
+                try:
+                    future = self._executor.submit(_run_job, self._shared, job_id, function, args)
+                except BrokenProcessPool:
+                    # a job process died (e.g. out of memory), which breaks the whole pool
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    future = self._executor.submit(_run_job, self._shared, job_id, function, args)
+                self._jobs[job_id] = Job(future)
+                return job_id
+
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as e:
+            future.set_exception(e)
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].subscribers += 1
+            else:
+                self._jobs[job_id] = Job(future)
+        return job_id
+
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self._jobs
+
+    def done(self, job_id: str) -> bool:
+        return self._jobs[job_id].future.done()
+
+    def progress(self, job_id: str):
+        """(fraction, message) last reported by the job."""
+        if self._shared is None:
+            return 0.0, ""
+        return self._shared.get(job_id, (0.0, ""))
+
+    def result(self, job_id: str):
+        """Result of a finished job (raises what the job raised), unsubscribes from the job."""
+        future = self._jobs[job_id].future
+        self.release(job_id)
+        return future.result()
+
+    def release(self, job_id: str):
+        """Unsubscribe from a job, e.g. because a newer request superseded it."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.subscribers -= 1
+            if job.subscribers > 0:
+                return
+            del self._jobs[job_id]
+            if not job.future.done() and not job.future.cancel():
+                # already running, it stops at its next progress report
+                self._shared[("cancelled", job_id)] = True
+            if self._shared is not None:
+                self._shared.pop(job_id, None)
+
+    def _forget_expired(self):
+        now = time.monotonic()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > JOB_RESULT_TTL_SECONDS:
+                del self._jobs[job_id]
+                if self._shared is not None:
+                    self._shared.pop(job_id, None)
+
+
+job_manager = JobManager(JOB_WORKERS)
@@ -0,0 +1,31 @@
+import pandas as pd
+
+TIME_COLUMNS = ["LAP_TIME", "S1", "S2", "S3", "S1_LARGE", "S2_LARGE", "S3_LARGE"]
+
+
+def parse_lap_times(raw_times: pd.Series) -> pd.Series:
+    """Parse a column of timing strings into float milliseconds, NaN where unparsable."""
+    raw_times = raw_times.astype(str)
+    # "M:SS.fff" as well as "SS.fff" (sector times below one minute come without the minutes), padded
+    # to "HH:MM:SS.fff" for pandas' vectorised timedelta parser, which reads the fraction like %f
+    with_minutes = raw_times.str.contains(":", regex=False)
+    padded = ("00:" + raw_times).where(with_minutes, "00:00:" + raw_times)
+    return pd.to_timedelta(padded, errors="coerce") / pd.Timedelta(milliseconds=1)
+
+
+def format_lap_times(milliseconds: pd.Series) -> pd.Series:
+    """Format milliseconds as "MM:SS.fff" strings, the format shown in the lap tables."""
+    valid = milliseconds.notna()
+    total = milliseconds.fillna(0).round().astype("int64")
+    sign = total.lt(0).map({True: "-", False: ""})
+    minutes, rest = divmod(total.abs(), 60_000)
+    seconds, millis = divmod(rest, 1_000)
+    formatted = (sign + minutes.astype(str).str.zfill(2) + ":" + seconds.astype(str).str.zfill(2)
+                 + "." + millis.astype(str).str.zfill(3))
+    return formatted.where(valid)
+
+
+def add_parsed_times(df: pd.DataFrame) -> pd.DataFrame:
+    """Return ``df`` with a ``<column>_MS`` float column for every timing column it has."""
+    return df.assign(**{f"{time_column}_MS": parse_lap_times(df[time_column])
+                        for time_column in TIME_COLUMNS if time_column in df.columns})
@@ -0,0 +1,199 @@
+import io
+import os
+import re
+import threading
+
+import pandas as pd
+from flask import jsonify, request
+
+import analysis
+from app_dirs import data_dir, private_dir
+from ingest import read_timing_csv
+
+try:
+    import fcntl
+except ImportError:  # Windows, appends are only serialised within one process
+    fcntl = None
+
+LIVE_TIMING_DIR = os.environ.get("LIVE_TIMING_DIR") or data_dir("live")
+# session names end up in file paths
+SESSION_NAME = re.compile(r"[\w-]+")
+SECTOR_COLUMNS = ["S1_MS", "S2_MS", "S3_MS"]
+# laps shown in the live heatmap, older laps scroll out
+LIVE_HEATMAP_LAPS = 20
+
+
+def detect_separator(header: bytes) -> str:
+    return ";" if b";" in header else ","
+
+
+class LiveSession:
+    """Incrementally analysed timing file that is still being written to.
+
+    Every ``poll`` only reads the bytes appended since the last one and folds the new laps into
+    the per-driver fastest lap, best sectors and the lap matrix of the ``LIVE_HEATMAP_LAPS`` newest
+    laps, so an update costs O(new laps). ``version`` is the number of bytes read, so it is the same
+    in every worker process that has seen the same laps.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._offset = 0
+        self._header = None
+        self.fastest_laps = pd.DataFrame(columns=analysis.DRIVER_KEY + SECTOR_COLUMNS + ["LAP_TIME_MS"])
+        self.best_sectors = pd.DataFrame(columns=analysis.DRIVER_KEY + SECTOR_COLUMNS)
+        self.drivers = set()
+        # lap number -> {driver: lap time}, only the newest LIVE_HEATMAP_LAPS laps
+        self.lap_times = {}
+        self.lap_texts = {}
+
+    @property
+    def version(self) -> int:
+        return self._offset
+
+    def poll(self) -> int:
+        with self._lock:
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                return self.version
+            if size < self._offset:
+                # the file was truncated or replaced, i.e. a new session started
+                self._reset()
+            if size == self._offset:
+                return self.version
+
+            with open(self.path, "rb") as timing_file:
+                timing_file.seek(self._offset)
+                appended = timing_file.read(size - self._offset)
+            # only complete lines, a partially written last line is read by the next poll
+            complete = appended[:appended.rfind(b"\n") + 1]
+            if not complete:
+                return self.version
+            self._offset += len(complete)
+
+            if self._header is None:
+                header_end = complete.index(b"\n") + 1
+                self._header, complete = complete[:header_end], complete[header_end:]
+            if complete.strip():
+                laps = read_timing_csv(io.BytesIO(self._header + complete), detect_separator(self._header))
+                self._add_laps(laps)
+            return self.version
+
+    def _add_laps(self, laps: pd.DataFrame):
+        # plain values, categories of different batches would not line up
+        laps = laps.astype({"NUMBER": object, "DRIVER_NAME": str})
+
+        # like analysis.ideal_lap over all laps, including those without a (parsable) lap time
+        new_best_sectors = laps.groupby(analysis.DRIVER_KEY)[SECTOR_COLUMNS].min().reset_index()
+        self.best_sectors = pd.concat([self.best_sectors, new_best_sectors], ignore_index=True) \
+            .groupby(analysis.DRIVER_KEY)[SECTOR_COLUMNS].min().reset_index()
+
+        laps = laps[laps["LAP_TIME_MS"].notna()]
+        if laps.empty:
+            return
+        new_fastest_laps = laps.loc[laps.groupby(analysis.DRIVER_KEY)["LAP_TIME_MS"].idxmin(),
+                                    analysis.DRIVER_KEY + SECTOR_COLUMNS + ["LAP_TIME_MS"]]
+        self.fastest_laps = pd.concat([self.fastest_laps, new_fastest_laps], ignore_index=True) \
+            .sort_values(by="LAP_TIME_MS", kind="mergesort") \
+            .drop_duplicates(subset=analysis.DRIVER_KEY)
+
+        self.drivers.update(laps["DRIVER_NAME"].unique())
+        # laps without a lap number have no column in the heatmap
+        laps = laps[laps["LAP_NUMBER"].notna()]
+        if laps.empty:
+            return
+        window = sorted(set(self.lap_times).union(laps["LAP_NUMBER"].unique()))[-LIVE_HEATMAP_LAPS:]
+        recent_laps = laps[laps["LAP_NUMBER"] >= window[0]]
+        for driver, lap, lap_time, raw_time in zip(recent_laps["DRIVER_NAME"], recent_laps["LAP_NUMBER"],
+                                                   recent_laps["LAP_TIME_MS"], recent_laps["LAP_TIME"]):
+            self.lap_times.setdefault(lap, {})[driver] = lap_time
+            self.lap_texts.setdefault(lap, {})[driver] = raw_time
+        for lap in [lap for lap in self.lap_times if lap < window[0]]:
+            del self.lap_times[lap], self.lap_texts[lap]
+
+    def lap_tables(self):
+        """Fastest and ideal lap tables (display format) of the laps seen so far."""
+        with self._lock:
+            df_fastest_lap_per_driver = analysis.rank_fastest_laps(self.fastest_laps.astype({"LAP_TIME_MS": float}))
+            df_ideal_lap_per_driver = analysis.rank_ideal_laps(self.best_sectors.astype({column: float
+                                                                                         for column in SECTOR_COLUMNS}),
+                                                               df_fastest_lap_per_driver)
+        return analysis.fastest_lap_table(df_fastest_lap_per_driver), analysis.ideal_lap_table(df_ideal_lap_per_driver)
+
+    def lap_matrix(self):
+        """Drivers x laps matrices like analysis.lap_sequence_matrix of the ``LIVE_HEATMAP_LAPS`` newest laps."""
+        with self._lock:
+            drivers = sorted(self.drivers)
+            lap_times = pd.DataFrame(self.lap_times, index=drivers)
+            lap_texts = pd.DataFrame(self.lap_texts, index=drivers)
+        if lap_times.empty:
+            return lap_times, lap_texts
+        lap_times = lap_times.sort_index(axis=1)
+        return lap_times, lap_texts.reindex_like(lap_times).fillna("-")
+
+
+class LiveSessions:
+    """The live sessions of a directory: one ``<session>.csv`` per session."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._sessions = {}
+        self._lock = threading.Lock()
+        private_dir(directory)
+
+    def names(self) -> list:
+        return sorted(name[:-4] for name in os.listdir(self.directory)
+                      if name.endswith(".csv") and SESSION_NAME.fullmatch(name[:-4]))
+
+    def path(self, name: str) -> str:
+        if not isinstance(name, str) or SESSION_NAME.fullmatch(name) is None:
+            raise ValueError(f"Invalid session name: {name!r}")
+        return os.path.join(self.directory, f"{name}.csv")
+
+    def get(self, name: str) -> LiveSession:
+        with self._lock:
+            if name not in self._sessions:
+                self._sessions[name] = LiveSession(self.path(name))
+            return self._sessions[name]
+
+    def append(self, name: str, rows: bytes) -> int:
+        """Append CSV rows (starting with their header line) to a session, returns the number of rows."""
+        header, _, body = rows.partition(b"\n")
+        header = header.rstrip(b"\r") + b"\n"
+        if not header.strip():
+            raise ValueError("The rows have to start with a header line")
+        if body and not body.endswith(b"\n"):
+            body += b"\n"
+        with open(self.path(name), "ab") as timing_file:
+            if fcntl is not None:
+                fcntl.flock(timing_file, fcntl.LOCK_EX)
+            try:
+                if os.fstat(timing_file.fileno()).st_size == 0:
+                    timing_file.write(header)
+                else:
+                    with open(self.path(name), "rb") as existing:
+                        if existing.readline().rstrip(b"\r\n") != header.rstrip(b"\n"):
+                            raise ValueError("Header does not match the header of the session")
+                timing_file.write(body)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(timing_file, fcntl.LOCK_UN)
+        return body.count(b"\n")
+
+
+live_sessions = LiveSessions(LIVE_TIMING_DIR)
+
+
+def register_live_routes(flask_app):
+    @flask_app.route("/live/<session>/laps", methods=["POST"])
+    def append_live_laps(session):
+        try:
+            rows = live_sessions.append(session, request.get_data())
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"session": session, "rows": rows})
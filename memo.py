@@ -0,0 +1,139 @@
+import functools
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+from app_dirs import data_dir, private_dir
+
+
+def code_version() -> str:
+    """Hash of the app's modules and the Python version.
+
+    Part of every cache key, so results pickled by an earlier deploy (possibly of a different
+    shape) are never served.
+    """
+    digest = hashlib.sha1(repr(sys.version_info[:2]).encode("utf-8"))
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(app_dir)):
+        if name.endswith(".py"):
+            digest.update(name.encode("utf-8"))
+            with open(os.path.join(app_dir, name), "rb") as module_file:
+                digest.update(module_file.read())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Memoizes analysis results in a bounded in-memory LRU.
+
+    With ``cache_dir`` set, results are also pickled there (at most ``max_disk_entries``
+    files, oldest removed first), so every gunicorn worker pointed at the same directory
+    can serve a result another worker already computed. Keys include ``version``, so
+    results of other code versions sharing the directory are never loaded.
+    """
+
+    def __init__(self, max_entries: int, cache_dir: str = None, max_disk_entries: int = 1024, version: str = ""):
+        self.max_entries = max_entries
+        self.version = version
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir is not None:
+            private_dir(cache_dir)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "entries": len(self._results)}
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+        if self.cache_dir is not None:
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".pkl"):
+                    os.remove(entry.path)
+
+    def memoize(self, key):
+        """Decorator; ``key`` maps the call arguments to a hashable, repr-stable cache key."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                cache_key = hashlib.sha1(
+                    repr((self.version, function.__qualname__, key(*args, **kwargs))).encode("utf-8")).hexdigest()
+                found, result = self.get(cache_key)
+                if not found:
+                    result = function(*args, **kwargs)
+                    self.put(cache_key, result)
+                return result
+            return wrapper
+        return decorator
+
+    def get(self, cache_key: str):
+        with self._lock:
+            if cache_key in self._results:
+                self._results.move_to_end(cache_key)
+                self.hits += 1
+                return True, self._results[cache_key]
+
+        result_path = self._result_path(cache_key)
+        if result_path is not None and os.path.exists(result_path):
+            try:
+                with open(result_path, "rb") as result_file:
+                    result = pickle.load(result_file)
+                os.utime(result_path)  # keeps the disk eviction least recently used
+            except (OSError, EOFError, pickle.UnpicklingError):
+                # removed or replaced by another worker in the meantime
+                pass
+            else:
+                self.disk_hits += 1
+                self._remember(cache_key, result)
+                return True, result
+
+        self.misses += 1
+        return False, None
+
+    def put(self, cache_key: str, result):
+        self._remember(cache_key, result)
+        if self.cache_dir is not None:
+            self._store(cache_key, result)
+
+    def _remember(self, cache_key: str, result):
+        with self._lock:
+            self._results[cache_key] = result
+            self._results.move_to_end(cache_key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def _result_path(self, cache_key: str):
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, f"{cache_key}.pkl")
+
+    def _store(self, cache_key: str, result):
+        result_path = self._result_path(cache_key)
+        tmp_path = f"{result_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as result_file:
+            pickle.dump(result, result_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, result_path)
+
+        stored = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".pkl")]
+        if len(stored) > self.max_disk_entries:
+            stored.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in stored[:len(stored) - self.max_disk_entries]:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+result_cache = ResultCache(
+    max_entries=int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "128")),
+    cache_dir=os.environ.get("RESULT_CACHE_DIR") or data_dir("results"),
+    version=os.environ.get("RESULT_CACHE_VERSION") or code_version()
+)
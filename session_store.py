@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from app_dirs import data_dir, private_dir
+from dataset_cache import HAS_PARQUET, is_dataset_id
+
+try:
+    import fcntl
+except ImportError:  # Windows, index updates are only serialised within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Parsed sessions kept on disk, one Parquet file per dataset id plus a JSON index.
+
+    The index holds the event, session, driver set and lap count of every stored session, so the
+    dashboard can list them without opening the files. ``load`` memory-maps the Parquet file and
+    reads only the requested columns. Nothing is stored without pyarrow.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._index = {}
+        self._index_mtime = None
+        self._lock = threading.Lock()
+        private_dir(directory)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, "index.json")
+
+    def _path(self, dataset_id: str) -> str:
+        # ids come from the browser (stored-session, compare-sessions) and end up in the path
+        if not is_dataset_id(dataset_id):
+            raise ValueError(f"Invalid dataset id: {dataset_id!r}")
+        return os.path.join(self.directory, f"{dataset_id}.parquet")
+
+    def save(self, dataset_id: str, df: pd.DataFrame, event: str, session: str, filename: str):
+        """Store a parsed session (written once per dataset id) and (re)index it, returns its index entry."""
+        if not HAS_PARQUET:
+            return None
+        path = self._path(dataset_id)
+        if not os.path.exists(path):
+            # write to a temporary file first so other workers never read a partial file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                df.to_parquet(tmp_path, index=False)
+            except (ValueError, TypeError):
+                # mixed-type object columns can't be stored as parquet
+                logger.warning("Dataset %s can't be stored as Parquet, it is not kept as a session", dataset_id)
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return None
+            os.replace(tmp_path, path)
+
+        last_lap = df["LAP_NUMBER"].max(skipna=True)
+        entry = {"dataset_id": dataset_id,
+                 "event": event or "",
+                 "session": session or os.path.splitext(filename)[0],
+                 "filename": filename,
+                 "drivers": sorted(df["DRIVER_NAME"].dropna().astype(str).unique()),
+                 # NA if the sheet has no lap numbers at all
+                 "laps": 0 if pd.isna(last_lap) else int(last_lap),
+                 "rows": len(df),
+                 "stored": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._update_index(lambda index: index.__setitem__(dataset_id, entry))
+        return entry
+
+    def remove(self, dataset_id: str):
+        self._update_index(lambda index: index.pop(dataset_id, None))
+        if os.path.exists(self._path(dataset_id)):
+            os.remove(self._path(dataset_id))
+
+    def clear(self):
+        with self._lock:
+            self._index = {}
+            self._index_mtime = None
+        for entry in os.scandir(self.directory):
+            os.remove(entry.path)
+
+    def entries(self) -> list:
+        """Index entries of all stored sessions, ordered by event and session."""
+        return sorted(self._read_index().values(), key=lambda entry: (entry["event"], entry["session"]))
+
+    def entry(self, dataset_id: str):
+        if not is_dataset_id(dataset_id):
+            return None
+        return self._read_index().get(dataset_id)
+
+    def load(self, dataset_id: str, columns: list = None):
+        if dataset_id not in self:
+            return None
+        return pd.read_parquet(self._path(dataset_id), columns=columns, memory_map=True)
+
+    def __contains__(self, dataset_id: str) -> bool:
+        return HAS_PARQUET and is_dataset_id(dataset_id) and os.path.exists(self._path(dataset_id))
+
+    def _read_index(self) -> dict:
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            # other workers write the index too, re-read it whenever the file changed
+            if mtime != self._index_mtime:
+                with open(self.index_path) as index_file:
+                    self._index = json.load(index_file)
+                self._index_mtime = mtime
+            return self._index
+
+    def _update_index(self, update):
+        with open(os.path.join(self.directory, "index.lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                index = dict(self._read_index())
+                update(index)
+                tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as index_file:
+                    json.dump(index, index_file, indent=1)
+                os.replace(tmp_path, self.index_path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+session_store = SessionStore(os.environ.get("SESSION_STORE_DIR") or data_dir("sessions"))
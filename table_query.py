@@ -0,0 +1,67 @@
+import math
+
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+# DataTable filter operators, longest spelling first so "<=" isn't read as "<"
+FILTER_OPERATORS = [["ge ", ">="], ["le ", "<="], ["lt ", "<"], ["gt ", ">"], ["ne ", "!="], ["eq ", "="],
+                    ["contains "], ["datestartswith "]]
+COMPARISONS = {"ge", "le", "lt", "gt", "ne", "eq"}
+
+
+def split_filter_part(filter_part: str):
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find("{") + 1: name_part.rfind("}")]
+                value = value_part.strip()
+                quote = value[:1]
+                if quote in ("'", '"', "`") and value.endswith(quote) and len(value) > 1:
+                    value = value[1:-1].replace("\\" + quote, quote)
+                return name, operator_type[0].strip(), value
+    return None, None, None
+
+
+def apply_filter_query(df: pd.DataFrame, filter_query: str) -> pd.DataFrame:
+    """Apply a DataTable ``filter_query`` (as sent with ``filter_action='custom'``)."""
+    for filter_part in (filter_query or "").split(" && "):
+        column, operator, value = split_filter_part(filter_part)
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if operator in COMPARISONS:
+            if is_numeric_dtype(values):
+                try:
+                    value = float(value)
+                except ValueError:
+                    values, value = values.astype(str), str(value)
+            else:
+                values = values.astype(str)
+            df = df.loc[getattr(values, operator)(value)]
+        elif operator == "contains":
+            df = df.loc[values.astype(str).str.contains(value, regex=False)]
+        elif operator == "datestartswith":
+            df = df.loc[values.astype(str).str.startswith(value)]
+    return df
+
+
+def page_records(df: pd.DataFrame, page_current: int, page_size: int, sort_by: list = None,
+                 filter_query: str = None, columns: list = None):
+    """Filter, sort and slice ``df`` for a DataTable with custom paging.
+
+    Returns the records of the requested page (only ``columns`` if given) and the resulting page
+    count, so only one page of the table is serialised per request.
+    """
+    df = apply_filter_query(df, filter_query)
+    if sort_by:
+        df = df.sort_values([sort["column_id"] for sort in sort_by],
+                            ascending=[sort["direction"] == "asc" for sort in sort_by],
+                            kind="mergesort", na_position="last")
+    page_count = max(1, math.ceil(len(df) / page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    page = df.iloc[page_current * page_size:(page_current + 1) * page_size]
+    if columns is not None:
+        page = page[columns]
+    # missing values as None, the pd.NA of nullable integer columns isn't JSON serialisable
+    return page.astype(object).where(page.notna(), None).to_dict("records"), page_count
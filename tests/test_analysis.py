@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import fastest_lap, ideal_lap, position_deltas, rank_fastest_laps, rank_ideal_laps
+
+
+def reference_ideal_positions(df_fastest_lap_per_driver: pd.DataFrame, df_ideal_lap_per_driver: pd.DataFrame) -> dict:
+    # the original per-driver loop: swap in the driver's ideal lap, re-sort the table and read the position
+    ideal_position = {}
+    for index, row in df_ideal_lap_per_driver.iterrows():
+        df_base = df_fastest_lap_per_driver.copy()
+        ideal_driver_time = row["IDEAL_LAP_MS"]
+        driver = row["DRIVER_NAME"]
+        df_base.loc[df_base.DRIVER_NAME == driver, "LAP_TIME_MS"] = ideal_driver_time
+        df_base = df_base.sort_values(by="LAP_TIME_MS", ascending=True, kind="mergesort")
+        df_base["P"] = [i for i in range(1, len(df_base) + 1)]
+        ideal_position[driver] = df_base.loc[df_base.DRIVER_NAME == driver, "P"].values[0]
+    return ideal_position
+
+
+def random_grid(seed: int, drivers: int, spread: int, inconsistent: bool, missing_sectors: bool):
+    rng = np.random.default_rng(seed)
+    # few distinct sector times, so many laps and ideal laps tie
+    sectors = rng.integers(30000, 30000 + spread, size=(drivers, 3)).astype(float)
+    lap_times = sectors.sum(axis=1)
+    if inconsistent:
+        # lap times that don't match their sectors, so some ideal laps are slower than the fastest lap
+        lap_times += rng.integers(-spread, spread + 1, size=drivers)
+    df_fastest_lap_per_driver = rank_fastest_laps(pd.DataFrame({
+        "NUMBER": np.arange(drivers),
+        "DRIVER_NAME": [f"driver {driver}" for driver in range(drivers)],
+        "S1_MS": sectors[:, 0], "S2_MS": sectors[:, 1], "S3_MS": sectors[:, 2],
+        "LAP_TIME_MS": lap_times}))
+
+    df_best_sectors = df_fastest_lap_per_driver[["NUMBER", "DRIVER_NAME", "S1_MS", "S2_MS", "S3_MS"]].copy()
+    # best sectors at most as fast as the fastest lap's sectors
+    df_best_sectors[["S1_MS", "S2_MS", "S3_MS"]] -= rng.integers(0, spread, size=(drivers, 3))
+    if missing_sectors:
+        # drivers without a time in some sector have no ideal lap
+        df_best_sectors.loc[rng.random(drivers) < 0.2, "S2_MS"] = np.nan
+    return df_fastest_lap_per_driver, rank_ideal_laps(df_best_sectors, df_fastest_lap_per_driver)
+
+
+@pytest.mark.parametrize("inconsistent", [False, True])
+@pytest.mark.parametrize("missing_sectors", [False, True])
+@pytest.mark.parametrize("spread", [2, 5, 1000])
+@pytest.mark.parametrize("seed", range(10))
+def test_your_ideal_position_matches_reference(seed, spread, missing_sectors, inconsistent):
+    df_fastest_lap_per_driver, df_ideal_lap_per_driver = random_grid(seed, 25, spread, inconsistent, missing_sectors)
+
+    positions = position_deltas(df_fastest_lap_per_driver, df_ideal_lap_per_driver)
+
+    expected = reference_ideal_positions(df_fastest_lap_per_driver, df_ideal_lap_per_driver)
+    assert dict(zip(positions["DRIVER_NAME"], positions["your_ideal_position"])) == expected
+
+
+def test_your_ideal_position_single_driver():
+    df_fastest_lap_per_driver, df_ideal_lap_per_driver = random_grid(0, 1, 100, True, False)
+
+    positions = position_deltas(df_fastest_lap_per_driver, df_ideal_lap_per_driver)
+
+    assert positions["your_ideal_position"].tolist() == [1]
+
+
+def test_ideal_lap_counts_sectors_of_laps_without_lap_time():
+    df = pd.DataFrame({
+        "NUMBER": [1, 1, 2],
+        "DRIVER_NAME": ["driver 1", "driver 1", "driver 2"],
+        "S1_MS": [30000.0, 29000.0, 31000.0],
+        "S2_MS": [30000.0, 30000.0, 30000.0],
+        "S3_MS": [30000.0, 30000.0, 30000.0],
+        # the second lap's time is missing or couldn't be parsed, its sectors are valid
+        "LAP_TIME_MS": [90000.0, np.nan, 91000.0]})
+
+    df_ideal_lap_per_driver = ideal_lap(df, fastest_lap(df))
+
+    ideal_laps = dict(zip(df_ideal_lap_per_driver["DRIVER_NAME"], df_ideal_lap_per_driver["IDEAL_LAP_MS"]))
+    assert ideal_laps == {"driver 1": 89000.0, "driver 2": 91000.0}
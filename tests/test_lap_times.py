@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from lap_times import add_parsed_times, format_lap_times, parse_lap_times
+
+
+@pytest.mark.parametrize("raw_time, milliseconds", [
+    ("1:23.456", 83456.0),
+    ("0:05.100", 5100.0),
+    ("12:00.000", 720000.0),
+    ("99:59.999", 5999999.0),
+    # sector times below a minute come without the minutes
+    ("59.9", 59900.0),
+    ("5.100", 5100.0),
+    ("0.5", 500.0),
+])
+def test_parse_minutes_and_seconds(raw_time, milliseconds):
+    assert parse_lap_times(pd.Series([raw_time])).tolist() == [milliseconds]
+
+
+@pytest.mark.parametrize("raw_time, milliseconds", [
+    # the fraction is read like strptime's %f
+    ("1:00.4", 60400.0),
+    ("1:00.45", 60450.0),
+    ("1:00.456", 60456.0),
+    ("1:00.4567", 60456.7),
+    ("1:00.45678", 60456.78),
+    ("12.34567", 12345.67),
+])
+def test_parse_fraction_digits(raw_time, milliseconds):
+    assert parse_lap_times(pd.Series([raw_time])).tolist() == [pytest.approx(milliseconds)]
+
+
+def test_parse_missing_and_unparsable_times():
+    raw_times = pd.Series(["", "nan", None, np.nan, "abc", "1:02:03.4", "-0:01.500", "1:23.456 x"], dtype=object)
+
+    assert parse_lap_times(raw_times).isna().all()
+
+
+def test_parse_keeps_index_and_returns_floats():
+    parsed = parse_lap_times(pd.Series(["1:23.456", ""], index=[7, 3]))
+
+    assert parsed.dtype == np.float64
+    assert parsed.index.tolist() == [7, 3]
+    assert parsed.loc[7] == 83456.0
+
+
+def test_format_lap_times():
+    milliseconds = pd.Series([83456.0, 5100.0, 0.0, 4500000.0, 83456.7])
+
+    assert format_lap_times(milliseconds).tolist() == ["01:23.456", "00:05.100", "00:00.000", "75:00.000", "01:23.457"]
+
+
+def test_format_negative_gaps():
+    # IDEAL_VS_FASTEST is negative for inconsistent sector data
+    assert format_lap_times(pd.Series([-1500.0, -61000.0])).tolist() == ["-00:01.500", "-01:01.000"]
+
+
+def test_format_missing_times():
+    formatted = format_lap_times(pd.Series([np.nan, 1000.0]))
+
+    assert pd.isna(formatted.iloc[0])
+    assert formatted.iloc[1] == "00:01.000"
+
+
+@pytest.mark.parametrize("raw_time", ["1:23.456", "0:05.100", "59.900", "12:00.000", "99:59.999"])
+def test_parse_format_round_trip(raw_time):
+    milliseconds = parse_lap_times(pd.Series([raw_time]))
+
+    assert parse_lap_times(format_lap_times(milliseconds)).tolist() == milliseconds.tolist()
+
+
+def test_format_parse_round_trip():
+    milliseconds = pd.Series(np.random.default_rng(0).integers(0, 100 * 60_000, size=1000).astype(float))
+
+    assert parse_lap_times(format_lap_times(milliseconds)).tolist() == milliseconds.tolist()
+
+
+def test_add_parsed_times_only_for_present_columns():
+    df = pd.DataFrame({"LAP_TIME": ["1:23.456"], "S1": ["28.1"], "DRIVER_NAME": ["A"]})
+
+    parsed = add_parsed_times(df)
+
+    assert parsed["LAP_TIME_MS"].tolist() == [83456.0]
+    assert parsed["S1_MS"].tolist() == [28100.0]
+    assert "S2_MS" not in parsed.columns
+    assert "LAP_TIME_MS" not in df.columns